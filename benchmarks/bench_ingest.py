@@ -0,0 +1,214 @@
+"""
+End-to-end benchmark of main.py's ingestion pipeline against fake Drive and Gemini services.
+
+Generates a synthetic corpus, points main.py's Drive service and Gemini pool at the fakes
+in benchmarks/fake_services.py, and runs the real list -> download -> convert ->
+fingerprint -> extract -> clean -> write path in a scratch directory, so no quota is
+spent and none of the repo's caches, manifests or banks are touched. Reports files/min,
+per-stage latency distributions and peak RSS.
+
+With --resume-check N, the last N files written are then rolled back to the CLEANED state
+(their bank lines and manifest entries removed, as if the run had died just before writing
+them) and main.run(resume=True) is checked to write each of them once, as extracted.
+
+Usage:
+    python benchmarks/bench_ingest.py --files 200 --gemini-latency 0.5 --error-rate 0.02
+    python benchmarks/bench_ingest.py --files 50 --resume-check 5
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeDrive, FakeGemini, build_corpus
+
+
+def peak_rss_mb(who):
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def latency_table(stage_seconds, percentile):
+    lines = [f"{'stage':<12}{'count':>7}{'p50 s':>9}{'p90 s':>9}{'p99 s':>9}{'max s':>9}{'total s':>10}"]
+    for stage, values in stage_seconds.items():
+        lines.append(
+            f"{stage:<12}{len(values):>7}{percentile(values, 0.5):>9.3f}{percentile(values, 0.9):>9.3f}"
+            f"{percentile(values, 0.99):>9.3f}{max(values):>9.3f}{sum(values):>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def check_resume_from_cleaned(main, drive, root, count):
+    """
+    Rolls the last count files written back to CLEANED and resumes the run.
+
+    Returns:
+        dict: The rolled back file ids and what the resumed run recorded for them.
+    """
+    from job_queue import CLEANED
+    from manifest import EXTRACTED
+
+    bank_path = 'beta_bank.json'
+    with open(bank_path, 'r') as f:
+        lines = f.readlines()
+    conn = sqlite3.connect(main.QUEUE_FILE)
+    by_result = {result + "\n": file_id for file_id, result in conn.execute("SELECT id, result FROM jobs WHERE result IS NOT NULL")}
+    rolled_back = [by_result[line] for line in lines[len(lines) - count:]]
+    with open(bank_path, 'w') as f:
+        f.writelines(lines[:len(lines) - count])
+    conn.executemany(
+        "UPDATE jobs SET state = ?, outcome = NULL, bank_offset = NULL WHERE id = ?",
+        [(CLEANED, file_id) for file_id in rolled_back],
+    )
+    conn.commit()
+    conn.close()
+    with open(main.MANIFEST_FILE, 'r') as f:
+        entries = [line for line in f if json.loads(line)['id'] not in rolled_back]
+    with open(main.MANIFEST_FILE, 'w') as f:
+        f.writelines(entries)
+
+    with open('resume.log', 'w') as log, contextlib.redirect_stdout(log):
+        main.run(drive, [root], resume=True)
+
+    with open(bank_path, 'r') as f:
+        resumed = f.readlines()
+    manifest = main.Manifest(main.MANIFEST_FILE)
+    outcomes = {file_id: manifest.get(file_id)['outcome'] for file_id in rolled_back}
+    conn = sqlite3.connect(main.QUEUE_FILE)
+    queue_outcomes = dict(conn.execute(
+        f"SELECT id, outcome FROM jobs WHERE id IN ({', '.join('?' * len(rolled_back))})", rolled_back,
+    ).fetchall())
+    conn.close()
+    assert sorted(resumed) == sorted(lines), "resumed bank differs from the uninterrupted one"
+    assert all(outcome == EXTRACTED for outcome in outcomes.values()), f"manifest outcomes: {outcomes}"
+    assert all(outcome == EXTRACTED for outcome in queue_outcomes.values()), f"queue outcomes: {queue_outcomes}"
+    print(f"Resume from CLEANED: {len(rolled_back)} files written once each, recorded as {EXTRACTED}")
+    return {'files': rolled_back, 'outcomes': outcomes}
+
+
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix='ingest-bench-')
+    start_dir = os.getcwd()
+    # main.py keeps its caches and outputs in relative paths, and process-pool workers
+    # inherit the working directory, so the whole run happens inside work_dir
+    os.chdir(work_dir)
+    try:
+        import main
+        from gemini_pool import GeminiPool
+        from metrics import percentile
+
+        print(f"Building a corpus of {args.files} files...")
+        root, corpus = build_corpus(
+            args.files, main.events, folders=args.folders, pages=args.pages,
+            questions_per_page=args.questions_per_page, duplicate_fraction=args.duplicate_fraction,
+            seed=args.seed,
+        )
+        drive = FakeDrive(corpus, latency=args.drive_latency, bandwidth=args.bandwidth)
+        gemini = FakeGemini(
+            latency=args.gemini_latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+            rpm=args.server_rpm, truncate_rate=args.truncate_rate, seed=args.seed,
+        )
+        os.makedirs(main.OUTPUT_DIR, exist_ok=True)
+        main.build_drive_service = lambda: drive
+        main.gemini_pool = GeminiPool(
+            [f'fake-key-{i}' for i in range(args.keys)], client_factory=gemini.client,
+            rpm=args.rpm, base_delay=args.base_delay,
+        )
+        for name in ('download', 'convert', 'extract', 'clean'):
+            value = getattr(args, f'{name}_workers')
+            if value:
+                setattr(main, f'{name.upper()}_WORKERS', value)
+        main.CLEAN_BATCH_WAIT = args.batch_wait
+
+        print(f"Running the pipeline in {work_dir} (log: {os.path.join(work_dir, 'ingest.log')})...")
+        started = time.perf_counter()
+        with open('ingest.log', 'w') as log, contextlib.redirect_stdout(log):
+            metrics = main.run(drive, [root])
+        elapsed = time.perf_counter() - started
+
+        files = sum(metrics.outcomes.values())
+        report = {
+            'files': files,
+            'seconds': round(elapsed, 2),
+            'files_per_min': round(files / elapsed * 60, 1) if elapsed else 0.0,
+            'outcomes': dict(metrics.outcomes),
+            'totals': dict(metrics.totals),
+            'stages': {
+                stage: {
+                    'count': len(values),
+                    'p50': round(percentile(values, 0.5), 4),
+                    'p90': round(percentile(values, 0.9), 4),
+                    'p99': round(percentile(values, 0.99), 4),
+                    'max': round(max(values), 4),
+                    'total': round(sum(values), 2),
+                }
+                for stage, values in metrics.stage_seconds.items()
+            },
+            'peak_rss_mb': round(peak_rss_mb(resource.RUSAGE_SELF), 1),
+            'peak_child_rss_mb': round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+            'drive_calls': dict(drive.calls),
+            'gemini_calls': dict(gemini.calls),
+            'gemini_keys': main.gemini_pool.stats(),
+        }
+        print(f"{files} files in {elapsed:.1f}s ({report['files_per_min']} files/min)")
+        print(f"Outcomes: {report['outcomes']}")
+        print(latency_table(metrics.stage_seconds, percentile))
+        print(f"Peak RSS: {report['peak_rss_mb']} MB (largest worker process: {report['peak_child_rss_mb']} MB)")
+        print(f"Drive calls: {report['drive_calls']}")
+        print(f"Gemini calls: {report['gemini_calls']}")
+        if args.resume_check:
+            report['resume_check'] = check_resume_from_cleaned(main, drive, root, args.resume_check)
+        return report
+    finally:
+        os.chdir(start_dir)
+        if args.keep:
+            print(f"Kept {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark main.py's ingestion pipeline against fake Drive and Gemini services.")
+    parser.add_argument('--files', type=int, default=100, help="Documents in the synthetic corpus")
+    parser.add_argument('--folders', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=3, help="Pages per document")
+    parser.add_argument('--questions-per-page', type=int, default=8)
+    parser.add_argument('--duplicate-fraction', type=float, default=0.1, help="Share of documents that re-upload an earlier one")
+    parser.add_argument('--drive-latency', type=float, default=0.02, help="Seconds per Drive listing page or download chunk")
+    parser.add_argument('--bandwidth', type=float, default=None, help="Download speed in bytes/s (default: unlimited)")
+    parser.add_argument('--gemini-latency', type=float, default=0.5, help="Mean seconds per Gemini call")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Chance a Gemini call fails with a 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Chance a Gemini call fails with a 429")
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help="Chance an extraction response is cut off")
+    parser.add_argument('--server-rpm', type=int, default=None, help="Per-key quota the fake Gemini enforces with 429s")
+    parser.add_argument('--keys', type=int, default=4, help="Number of fake API keys")
+    parser.add_argument('--rpm', type=int, default=600, help="Per-key requests/min the key pool allows itself")
+    parser.add_argument('--base-delay', type=float, default=0.1, help="Key pool backoff base delay in seconds")
+    parser.add_argument('--download-workers', type=int, default=None)
+    parser.add_argument('--convert-workers', type=int, default=None)
+    parser.add_argument('--extract-workers', type=int, default=None)
+    parser.add_argument('--clean-workers', type=int, default=None)
+    parser.add_argument('--batch-wait', type=float, default=1.0, help="Cleanup batcher max wait in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--resume-check', type=int, default=0, metavar='N', help="Afterwards roll the last N files written back to CLEANED and check a resumed run writes them once")
+    parser.add_argument('--json', help="Also write the report to this JSON file")
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch directory for inspection")
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    report = run_benchmark(args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
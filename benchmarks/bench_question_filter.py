@@ -0,0 +1,181 @@
+"""
+Checks question_filter against the filter comprehension toDB.py used to run, and times both.
+
+Builds a synthetic bank from the real questions in edited.json and blacklist.json plus
+variants crafted to trip every rule (figure labels, station references, placeholder
+answers, lettered options and so on), asserts that both filters keep exactly the same
+questions, and reports the speedup.
+
+Usage:
+    python benchmarks/bench_question_filter.py --questions 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import regex as re
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from question_filter import PHRASES, BAD_PREFIXES, accepts, reject_reason
+
+def legacy_filter(value):
+    """toDB.combine_bank_data's original filter comprehension, verbatim."""
+    return [
+        item
+        for item in value
+        if item.get('answers') and isinstance(item['answers'],list) and len(item['answers']) > 0 and item.get("question") and ('options' not in item or len(item['options']) != 1)
+        and not (item['answers'][0] == "" or isinstance(item['answers'][0],list) and (item['answers'][0] == [""] or item['answers'][0] == [[]] or item['answers'][0] == [[""]]))
+        and len(item['question']) > 8
+        and not (isinstance(item['answers'][0], str) and "see answer" in item['answers'][0].lower())
+        and not ("based on" in item['question'] and "provided" in item['question'] or "information" in item['question'] and "provided" in item['question'])
+        and not (len(item['question']) < 85 and " this " in item['question'])
+        and not (len(item['question']) < 60 and "this object" in item['question'])
+        and not (isinstance(item['answers'][0],str) and ("answer" in item['answers'][0] or "depends" in item['answers'][0]))
+        and not ("is this?" in item['question'] and len(item['question']) < 40)
+        and not (item['question'].lower().startswith("which letter"))
+        and not (item['question'].lower().startswith("based on your"))
+        and not (item['question'].lower().startswith("based on the"))
+        and not (item['question'].lower().startswith("based on this"))
+        and not (item['question'].lower().startswith("these are"))
+        and not (item['question'].lower().startswith("calculate the"))
+        and not (item['question'].lower().startswith("participants"))
+        and not (len(item['question']) < 3)
+        and not (isinstance(item['answers'][0],str) and item['answers'][0].lower() == "free response")
+        and not (isinstance(item['answers'][0],str) and item['answers'][0].lower() == "requires missing")
+        and not (isinstance(item['answers'][0],str) and item['answers'][0].lower() == "unknown")
+        and not (isinstance(item['answers'][0],str) and item['answers'][0].lower() == "refer to")
+        and not ("station" in item['question'].lower() and not item['question'].lower().startswith("station"))
+        and not (bool(re.search(r"(q|Q)uestion [0-9]+[^:]",item['question'])))
+        and not (bool(re.search(r"(?<=(((i|I)mages*)|(e|E)vents*)|((f|F)eatures*)|(row)|((p|P)owder)|(patient)|((l|L)abels*)|(labeled)|(horomone)|(items*)|(ganglion)|(disorders*)|((r|R)egion)|(when)|((N|n)euron)|(Box)|((s|S)pecimens*)|((m|M)odels*)|((l|L)ayers*)|(part of)|((s|S)olids*)|((f|F)igure)|((m|M)etals*)|((h|H)airs*)|((f|F)ibers*)|((p|P)lastics*)|((f|F)ingerprints*)|((s|S)oils*)|((s|S)tructures*)|((p|P)oint)|((u|U)nit)|((p|P)anel)|((f|F)eatures*)|((l|L)iquid)|((f|F)igures*)|((s|S)pecimens*)|((p|P)oints*)|((l|L)etters*)|((f|F)ibers*)|((s|S)ymbol)) (([A-Z]+|[0-9]+)[\s.,?!;:])",item['question'])))
+        and not (len(item['answers']) == 1 and item['answers'][0] == '')
+        and not (sum(map(lambda s: 1 if isinstance(s, str) and len(s)==1 else 0, item['answers'])) > 2)
+        and not (False if not 'options' in item or item['options'] is None else (any(s == "A" for s in item['options']) and not "climate" in item['question'] and not "vitamin" in item['question']))
+        and not (item['question'] == item['answers'][0])
+        and not any(phrase in item['question'].lower() for phrase in [
+            " a?", " b?", " c?", " d?", " g?", " h?", " i?", " j?", " k?", " l?", " m?", " n?", " o?", " p?", " q?", " r?", " s?", " t?", " u?"
+            "this picture", "this image", "this diagram", "this map",
+            "in figure", "pictured below",
+            "this specimen", "this organism", "the photo below",
+            "given information", "the table", "the structures labeled",
+            "specimen 1", "specimen 2", "specimen 3", "specimen 4", "specimen 5",
+            "specimen 6", "specimen 7", "specimen 8", "specimen 9", "specimen 10",
+            "this individual", "Identify #", "diagram below", "the diagram", 
+            "slide above", "picture below", "the picture", "shown above", "shown below", "question #",
+            "indicated by", "diagram to the right", "this device", "these specimens", "multiple choice",
+            "shown to the right", "(left)", "(right)", "graph above",
+            "the reading on", "the image", 
+            "labeled by", "which image", "above image", "below image", "in the image",
+            "depicted", "the figure", "above?", "to the right", "the chart", 
+            "the diagram", "red arrow", "black arrow", "the arrow",
+            "labelled", "for the given", "if this", "above equation",
+            "original test", "fossil above", "question (", "depicted", "projection 1", "projection 2", 
+            "projection 3", "the map?", "circular symbol", "union hill", "locations 1", "location 1", 
+            "at the right?", "on the map", "interpret the", "evidence a", "evidence b", 
+            "evidence c", "which suspect", "what is the id ", "are you currently in a location where you cannot see or talk to your partner?", 
+            "honor code", "from the provided answer key", "according to article", "previous question",
+            "found at the scene", "according to elsa's bio", "from the scenario", "on my honor", 
+            "following questions refer to light and electron microscopes", "given the following graph",
+            "shown on the graph", "suspect no.", "from the given scenario", "the competitors"
+        ])
+        and not any(question in item['question'].lower() for question in [
+            "information needed"
+        ])
+    ]
+
+
+LABELS = ["Figure B.", "figure 3,", "Specimen 12?", "image A ", "Box C;", "point 4!", "labels AB:", "Unit 2\u2003", "events 7\u001c", "part of X.", "row 5 "]
+ANSWER_VARIANTS = [[""], [[""]], [[]], [["" ]], ["A", "B", "C"], ["see answer key"], ["Unknown"], ["It depends"], ["free response"], ["Refer to"], [1], [2, 3], ["2"], ["mitochondria"], []]
+
+
+def load_questions():
+    """Real questions (with their options and answers) from the checked-in review files."""
+    items = []
+    for name in ('edited.json', 'blacklist.json'):
+        path = os.path.join(REPO_ROOT, name)
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            for entries in json.load(f).values():
+                for entry in entries:
+                    for field in ('original', 'edited'):
+                        try:
+                            item = json.loads(entry[field]) if isinstance(entry, dict) else None
+                        except (KeyError, TypeError, json.JSONDecodeError):
+                            continue
+                        if isinstance(item, dict) and isinstance(item.get('question'), str):
+                            items.append(item)
+    return items or [{"question": "What is the primary role of decomposers in an ecosystem?", "options": ["Producing energy", "Breaking down dead organic matter"], "answers": [2]}]
+
+
+def mutate(item, rng):
+    """Returns a copy of item with zero or more rule-triggering changes."""
+    item = json.loads(json.dumps(item))
+    question = item['question']
+    for _ in range(rng.choice([0, 0, 1, 1, 2])):
+        roll = rng.randrange(12)
+        if roll == 0:
+            question = rng.choice(BAD_PREFIXES).capitalize() + " " + question
+        elif roll == 1:
+            phrase = rng.choice(PHRASES)
+            position = rng.randrange(len(question) + 1)
+            question = question[:position] + (phrase.upper() if rng.random() < 0.3 else phrase) + question[position:]
+        elif roll == 2:
+            position = rng.randrange(len(question) + 1)
+            question = question[:position] + " " + rng.choice(LABELS) + question[position:]
+        elif roll == 3:
+            question = question + rng.choice([" (see question 12)", " question 4: x", " Question 7 below"])
+        elif roll == 4:
+            question = question[:rng.randint(0, 90)]
+        elif roll == 5:
+            question = rng.choice(["Station 3: ", "", "At this station, "]) + question
+        elif roll == 6:
+            item['answers'] = rng.choice(ANSWER_VARIANTS)
+        elif roll == 7:
+            item['options'] = rng.choice([["A", "B", "C", "D"], ["only"], [], ["x", "y"]])
+            question += rng.choice(["", " climate", " vitamin"])
+        elif roll == 8:
+            item.pop(rng.choice(['options', 'answers', 'question']), None)
+        elif roll == 9:
+            question = question[:50] + rng.choice([" this ", " this object ", " is this?", " based on the provided data"])
+        elif roll == 10 and item.get('answers'):
+            item['answers'] = [question]
+        else:
+            question = question.replace(" ", "  ", 1)
+    if 'question' in item:
+        item['question'] = question
+    return item
+
+
+def make_bank(size, seed):
+    rng = random.Random(seed)
+    base = load_questions()
+    return [mutate(rng.choice(base), rng) for _ in range(size)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare and time the question filter against the original comprehension.")
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    bank = make_bank(args.questions, args.seed)
+    start = time.perf_counter()
+    expected = legacy_filter(bank)
+    legacy_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    kept = [item for item in bank if accepts(item)]
+    engine_seconds = time.perf_counter() - start
+
+    if kept != expected:
+        mismatched = next(item for item in bank if (item in expected) != accepts(item))
+        print(f"MISMATCH: {json.dumps(mismatched)} -> {reject_reason(mismatched)}")
+        sys.exit(1)
+    print(f"{len(bank)} questions, {len(kept)} kept by both filters")
+    print(f"original comprehension: {legacy_seconds:.3f}s ({legacy_seconds / len(bank) * 1e6:.1f} us/question)")
+    print(f"question_filter:        {engine_seconds:.3f}s ({engine_seconds / len(bank) * 1e6:.1f} us/question)")
+    print(f"speedup: {legacy_seconds / engine_seconds:.1f}x")
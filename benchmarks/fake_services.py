@@ -0,0 +1,373 @@
+"""
+In-process stand-ins for Google Drive and Gemini, for benchmarking main.py without quota.
+
+FakeDrive serves a synthetic corpus through the same files().list / get_media /
+export_media calls the crawler and downloader make (media requests work with the real
+MediaIoBaseDownload), and FakeGemini answers generate_content calls with JSON derived
+from the prompt, after a configurable delay and with injectable errors and 429s.
+"""
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+
+import httplib2
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+PDF_MIME_TYPE = 'application/pdf'
+DOCX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+GOOGLE_DOC_MIME_TYPE = 'application/vnd.google-apps.document'
+
+WORDS = (
+    "cell membrane energy orbit pressure enzyme mineral crystal wave frequency current voltage "
+    "tissue neuron bone muscle organ species habitat climate erosion fossil planet star galaxy "
+    "nebula reaction acid base solution molecule atom bond force mass velocity density heat "
+    "entropy system cycle layer rock magma igneous sediment protein gene trait population"
+).split()
+
+
+# --- Synthetic documents ---
+def _pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages):
+    """
+    Builds a minimal, valid PDF with one Helvetica text page per list of lines.
+
+    Written by hand so the benchmark does not need a PDF writer installed.
+    """
+    objects = []
+    page_ids = []
+    font_id = 3
+    next_id = 4
+    page_objects = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 12 TL 50 760 Td\n" + "".join(f"({_pdf_escape(line)}) Tj T*\n" for line in lines) + "ET"
+        stream = stream.encode('latin-1', 'replace')
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        page_ids.append(page_id)
+        page_objects.append((content_id, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"))
+        page_objects.append((page_id, (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()))
+    objects.append((1, b"<< /Type /Catalog /Pages 2 0 R >>"))
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects.append((2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()))
+    objects.append((font_id, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"))
+    objects.extend(page_objects)
+    objects.sort()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for number, body in objects:
+        offsets[number] = out.tell()
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for number, _ in objects:
+        out.write(b"%010d 00000 n \n" % offsets[number])
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def make_docx(lines):
+    import docx
+    document = docx.Document()
+    for line in lines:
+        document.add_paragraph(line)
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_test_lines(rng, event, questions):
+    """Returns the lines of a synthetic multiple-choice test for an event."""
+    lines = [f"{event} Invitational", f"Event: {event}", ""]
+    for n in range(1, questions + 1):
+        lines.append(f"{n}. Which {' '.join(rng.choices(WORDS, k=rng.randint(6, 14)))}?")
+        for letter in "ABCD":
+            lines.append(f"{letter}) {' '.join(rng.choices(WORDS, k=rng.randint(1, 4)))}")
+        lines.append("")
+    return lines
+
+
+def build_corpus(num_files, events, folders=4, pages=3, questions_per_page=8, docx_fraction=0.25,
+                 google_doc_fraction=0.1, duplicate_fraction=0.1, filtered_fraction=0.05, seed=0):
+    """
+    Generates a synthetic Drive tree: `folders` subfolders under one root, holding PDFs,
+    DOCX files and Google Docs (stored as the DOCX they export to). A share of files are
+    exact re-uploads of earlier ones, and a share have names the filename rules reject.
+
+    Returns:
+        tuple: (root folder id, list of file dicts with Drive metadata plus 'parent' and 'data')
+    """
+    rng = random.Random(seed)
+    root = 'root-folder'
+    folder_ids = [f'folder-{i}' for i in range(folders)]
+    files = [{'id': folder_id, 'name': folder_id, 'mimeType': FOLDER_MIME_TYPE, 'parent': root} for folder_id in folder_ids]
+    documents = []
+    for i in range(num_files):
+        event = rng.choice(events)
+        if documents and rng.random() < duplicate_fraction:
+            original = rng.choice(documents)
+            mime_type, data = original['mimeType'], original['data']
+        else:
+            lines = make_test_lines(rng, event, pages * questions_per_page)
+            roll = rng.random()
+            if roll < google_doc_fraction:
+                mime_type, data = GOOGLE_DOC_MIME_TYPE, make_docx(lines)
+            elif roll < google_doc_fraction + docx_fraction:
+                mime_type, data = DOCX_MIME_TYPE, make_docx(lines)
+            else:
+                per_page = len(lines) // pages + 1
+                mime_type, data = PDF_MIME_TYPE, make_pdf([lines[p:p + per_page] for p in range(0, len(lines), per_page)])
+        name = f"{event} Test {i}"
+        if rng.random() < filtered_fraction:
+            name += " Answer Key"
+        if mime_type == PDF_MIME_TYPE:
+            name += ".pdf"
+        elif mime_type == DOCX_MIME_TYPE:
+            name += ".docx"
+        document = {
+            'id': f'file-{i}',
+            'name': name,
+            'mimeType': mime_type,
+            'parent': rng.choice(folder_ids),
+            'modifiedTime': '2024-01-01T00:00:00.000Z',
+            'size': str(len(data)),
+            'data': data,
+        }
+        if mime_type != GOOGLE_DOC_MIME_TYPE:
+            document['md5Checksum'] = hashlib.md5(data).hexdigest()
+        documents.append(document)
+    return root, files + documents
+
+
+# --- Drive ---
+class _Execute:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self, num_retries=0):
+        return self._fn()
+
+
+class _FakeHttp:
+    """Answers MediaIoBaseDownload's ranged GETs from an in-memory blob."""
+
+    def __init__(self, drive, data):
+        self.drive = drive
+        self.data = data
+
+    def request(self, uri, method='GET', headers=None, **kwargs):
+        total = len(self.data)
+        match = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get('range', ''))
+        start, end = (int(match.group(1)), int(match.group(2))) if match else (0, total - 1)
+        if total == 0 or start >= total:
+            return httplib2.Response({'status': 416, 'content-range': f'bytes */{total}'}), b''
+        end = min(end, total - 1)
+        content = self.data[start:end + 1]
+        self.drive._wait(len(content))
+        return httplib2.Response({'status': 206, 'content-range': f'bytes {start}-{end}/{total}'}), content
+
+
+class _MediaRequest:
+    def __init__(self, drive, file_id, data):
+        self.uri = f'fake://drive/{file_id}'
+        self.headers = {}
+        self.http = _FakeHttp(drive, data)
+
+
+class _Files:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q='', pageSize=100, pageToken=None, fields=None, **kwargs):
+        match = re.search(r"'([^']+)' in parents", q)
+        parent = match.group(1) if match else None
+
+        def run():
+            self.drive._wait(0)
+            self.drive._count('list')
+            children = self.drive.children.get(parent, [])
+            start = int(pageToken or 0)
+            page = [{k: v for k, v in f.items() if k not in ('data', 'parent')} for f in children[start:start + pageSize]]
+            result = {'files': page}
+            if start + pageSize < len(children):
+                result['nextPageToken'] = str(start + pageSize)
+            return result
+        return _Execute(run)
+
+    def get_media(self, fileId, **kwargs):
+        self.drive._count('get_media')
+        return _MediaRequest(self.drive, fileId, self.drive.files_by_id[fileId]['data'])
+
+    def export_media(self, fileId, mimeType=None, **kwargs):
+        self.drive._count('export_media')
+        return _MediaRequest(self.drive, fileId, self.drive.files_by_id[fileId]['data'])
+
+
+class FakeDrive:
+    """
+    Drive v3 service stand-in over a list of file dicts (see build_corpus).
+
+    Args:
+        files (list): Files and folders, each with 'id', 'name', 'mimeType', 'parent' and,
+            for documents, 'data'.
+        latency (float): Seconds added to every listing page and download chunk.
+        bandwidth (float): Download speed in bytes per second, or None for unlimited.
+    """
+
+    def __init__(self, files, latency=0.0, bandwidth=None):
+        self.files_by_id = {f['id']: f for f in files}
+        self.children = {}
+        for f in files:
+            self.children.setdefault(f['parent'], []).append(f)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _wait(self, size):
+        delay = self.latency + (size / self.bandwidth if self.bandwidth else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def files(self):
+        return _Files(self)
+
+
+# --- Gemini ---
+class FakeAPIError(Exception):
+    """Error raised by FakeGemini, carrying an HTTP-style code like the genai SDK's errors."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+QUESTION_LINE = re.compile(r"^\s*(\d+)[.)]\s+(.+)$")
+OPTION_LINE = re.compile(r"^\s*([A-H])[.)]\s+(.+)$")
+EVENT_LINE = re.compile(r"^\s*Event:\s*(.+?)\s*$", re.MULTILINE)
+
+
+def fake_extraction(text):
+    """Turns a synthetic test back into the JSON the extraction prompt asks for."""
+    event = EVENT_LINE.search(text)
+    questions = []
+    for line in text.splitlines():
+        match = QUESTION_LINE.match(line)
+        if match:
+            questions.append({'question': match.group(2), 'options': [], 'answers': [1], 'difficulty': 0.5})
+            continue
+        match = OPTION_LINE.match(line)
+        if match and questions:
+            questions[-1]['options'].append(match.group(2))
+    return {event.group(1) if event else 'Unknown': questions}
+
+
+class _Models:
+    def __init__(self, gemini, key):
+        self.gemini = gemini
+        self.key = key
+
+    def generate_content(self, model=None, contents=None, config=None):
+        return self.gemini.generate(self.key, contents or '')
+
+
+class _Client:
+    def __init__(self, gemini, key):
+        self.models = _Models(gemini, key)
+
+
+class FakeGemini:
+    """
+    generate_content stand-in for the extraction and cleanup prompts in main.py.
+
+    Pass `FakeGemini(...).client` as GeminiPool's client_factory.
+
+    Args:
+        latency (float): Mean seconds per call; each call sleeps uniformly 0.5x-1.5x of it.
+        error_rate (float): Chance a call fails with a 500.
+        rate_limit_rate (float): Chance a call fails with a 429 regardless of load.
+        rpm (int): Per-key requests per minute before calls fail with 429, or None.
+        truncate_rate (float): Chance an extraction response is cut off mid-JSON.
+        seed (int): Seed for the random choices above.
+    """
+
+    def __init__(self, latency=0.5, error_rate=0.0, rate_limit_rate=0.0, rpm=None, truncate_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.truncate_rate = truncate_rate
+        self.calls = Counter()
+        self._recent = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def client(self, key):
+        return _Client(self, key)
+
+    def _roll(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self.calls['requests'] += 1
+            recent = self._recent.setdefault(key, deque())
+            while recent and recent[0] <= now - 60:
+                recent.popleft()
+            if self.rpm is not None and len(recent) >= self.rpm:
+                self.calls['quota_429'] += 1
+                return 429
+            recent.append(now)
+            roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                self.calls['injected_429'] += 1
+                return 429
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.calls['injected_500'] += 1
+                return 500
+            return self._rng.uniform(0.5, 1.5) * self.latency
+
+    def generate(self, key, prompt):
+        outcome = self._roll(key)
+        if outcome == 429:
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED: quota exceeded")
+        if outcome == 500:
+            time.sleep(self.latency / 2)
+            raise FakeAPIError(500, "INTERNAL: fake server error")
+        time.sleep(outcome)
+        if "Here are the questions:" in prompt:
+            start = prompt.index('[', prompt.index("Here are the questions:"))
+            items, _ = json.JSONDecoder().raw_decode(prompt[start:])
+            verdicts = [{'id': item['id'], 'answers': item.get('answers') or [1], 'difficulty': 0.5} for item in items]
+            with self._lock:
+                self.calls['cleanup'] += 1
+            return _Response(json.dumps(verdicts))
+        text = prompt.split("Here's the test:", 1)[-1]
+        body = json.dumps(fake_extraction(text))
+        with self._lock:
+            self.calls['extraction'] += 1
+            truncate = self._rng.random() < self.truncate_rate
+            if truncate:
+                self.calls['truncated'] += 1
+        if truncate:
+            body = body[:max(1, int(len(body) * 0.7))]
+        return _Response(body)
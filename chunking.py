@@ -0,0 +1,161 @@
+import re
+from gemini_pool import estimate_tokens
+from text_extract import PAGE_BREAK
+
+# A line that starts a numbered question: "12.", "12)", "Q12:", "Question 12"
+QUESTION_START = re.compile(r"(?m)^[ \t]*(?:(?:q(?:uestion)?\s*)?\d{1,3}\s*[.):]|question\s+\d{1,3})", re.IGNORECASE)
+
+
+def _split_on_questions(page):
+    """Splits a page into pieces that each begin at a question number."""
+    starts = [m.start() for m in QUESTION_START.finditer(page)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return [page[a:b] for a, b in zip(starts, starts[1:] + [len(page)]) if page[a:b].strip()]
+
+
+def _hard_split(piece, max_tokens):
+    """Last resort for a single question longer than the budget: cut on line breaks."""
+    parts = []
+    current = []
+    size = 0
+    for line in piece.splitlines(keepends=True):
+        tokens = estimate_tokens(line)
+        if current and size + tokens > max_tokens:
+            parts.append(''.join(current))
+            current = []
+            size = 0
+        current.append(line)
+        size += tokens
+    if current:
+        parts.append(''.join(current))
+    return parts
+
+
+def _tail(unit, max_tokens):
+    """The end of a unit within max_tokens: whole questions if any fit, otherwise whole lines."""
+    for pieces in (_split_on_questions(unit), unit.splitlines(keepends=True)):
+        tail = []
+        size = 0
+        for piece in reversed(pieces):
+            tokens = estimate_tokens(piece)
+            if size + tokens > max_tokens:
+                break
+            tail.insert(0, piece)
+            size += tokens
+        if tail:
+            return ''.join(tail)
+    return ''
+
+
+def _carry(units, overlap_tokens):
+    """The (page, text) units that repeat the last overlap_tokens of a chunk at the start of the next."""
+    carried = []
+    size = 0
+    for page, unit in reversed(units):
+        tokens = estimate_tokens(unit)
+        if size + tokens > overlap_tokens:
+            tail = _tail(unit, overlap_tokens - size)
+            if tail:
+                carried.insert(0, (page, tail))
+            break
+        carried.insert(0, (page, unit))
+        size += tokens
+    return carried
+
+
+def _join(units):
+    """Joins (page, text) units back into text, with PAGE_BREAK wherever the page changes."""
+    parts = []
+    for i, (page, unit) in enumerate(units):
+        if i and page != units[i - 1][0]:
+            parts.append(PAGE_BREAK)
+        parts.append(unit)
+    return ''.join(parts)
+
+
+def split_into_chunks(text, max_tokens=6000, overlap_tokens=300):
+    """
+    Splits a test's text into chunks of at most roughly max_tokens.
+
+    Page boundaries are preferred; pages that are too big are split where numbered questions
+    start, and only a single oversized question is cut on line breaks. Pages within a chunk
+    stay separated by PAGE_BREAK. Each chunk after the first starts with up to
+    overlap_tokens of the end of the one before (the last whole questions that fit, or
+    else its last lines), so a question that straddles a boundary appears whole in the
+    next chunk (the merge step drops the duplicate).
+
+    Returns:
+        list: Chunk strings, in document order.
+    """
+    units = []
+    for page_number, page in enumerate(text.split(PAGE_BREAK)):
+        if estimate_tokens(page) <= max_tokens:
+            if page.strip():
+                units.append((page_number, page))
+            continue
+        for piece in _split_on_questions(page):
+            if estimate_tokens(piece) <= max_tokens:
+                units.append((page_number, piece))
+            else:
+                units.extend((page_number, part) for part in _hard_split(piece, max_tokens))
+
+    chunks = []
+    current = []
+    size = 0
+    for page_number, unit in units:
+        tokens = estimate_tokens(unit)
+        if current and size + tokens > max_tokens:
+            chunks.append(_join(current))
+            current = _carry(current, overlap_tokens)
+            size = sum(estimate_tokens(carried) for _, carried in current)
+            if size + tokens > max_tokens:
+                current = []
+                size = 0
+        current.append((page_number, unit))
+        size += tokens
+    if current:
+        chunks.append(_join(current))
+    return chunks
+
+
+def question_fingerprint(question):
+    """Normalizes a question's text so copies from overlapping chunks compare equal."""
+    return re.sub(r"[^a-z0-9]+", " ", str(question.get('question', '')).lower()).strip()
+
+
+def _completeness(question):
+    answers = question.get('answers') or []
+    return (len(question.get('options') or []), sum(1 for a in answers if a not in ("", [], None)))
+
+
+def merge_question_sets(question_sets):
+    """
+    Merges per-chunk extraction results into one {event: [questions]} dict.
+
+    Questions seen in more than one chunk are kept once per event, at the position of their
+    first appearance, preferring the copy with more options and answers.
+    """
+    merged = {}
+    positions = {}
+    for question_set in question_sets:
+        for event, questions in question_set.items():
+            if not isinstance(questions, list):
+                continue
+            event_questions = merged.setdefault(event, [])
+            event_positions = positions.setdefault(event, {})
+            for question in questions:
+                if not isinstance(question, dict):
+                    continue
+                fingerprint = question_fingerprint(question)
+                if not fingerprint:
+                    event_questions.append(question)
+                    continue
+                if fingerprint in event_positions:
+                    i = event_positions[fingerprint]
+                    if _completeness(question) > _completeness(event_questions[i]):
+                        event_questions[i] = question
+                    continue
+                event_positions[fingerprint] = len(event_questions)
+                event_questions.append(question)
+    return merged
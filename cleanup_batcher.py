@@ -0,0 +1,188 @@
+import copy
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from gemini_pool import estimate_tokens
+
+# Fields of each question sent for review; everything else stays local
+REVIEW_FIELDS = ('question', 'options', 'answers', 'difficulty')
+
+
+class CleanupBatcher:
+    """
+    Packs questions from many files into token-budgeted cleanup requests.
+
+    submit() hands over one file's extracted questions and returns a Future for the cleaned
+    result. Every question gets an id ("<job id>-<n>") that the model echoes back with its
+    verdict, so answers map back to the right question no matter how files were mixed into
+    batches. A batch is sent as soon as it reaches max_tokens, or once its oldest question
+    has waited max_wait seconds, on a pool of `workers` threads separate from extraction.
+
+    Verdicts are cached per question when a ResponseCache is given, so unchanged questions
+    never need another request.
+
+    A failed request is retried as two halves, down to single questions, so one question
+    the model chokes on doesn't fail every file that shared its batch. A question that
+    still fails on its own keeps its extracted answers, as one the model left out of its
+    response does, and isn't cached, so a later run reviews it again.
+
+    Args:
+        clean_fn (callable): Takes a list of {"id", "question", ...} dicts and returns the
+            model's list of {"id", "answers", "difficulty"} verdicts.
+        max_tokens (int): Approximate prompt budget per batch.
+        max_wait (float): Seconds a partial batch may wait for more questions.
+        workers (int): Cleanup requests in flight at once.
+        cache (ResponseCache): Optional verdict cache.
+        cache_scope (tuple): Model name and prompt version the verdicts depend on.
+    """
+
+    def __init__(self, clean_fn, max_tokens=8000, max_wait=5.0, workers=4, cache=None, cache_scope=('', 0)):
+        self.clean_fn = clean_fn
+        self.max_tokens = max_tokens
+        self.max_wait = max_wait
+        self.cache = cache
+        self.cache_scope = cache_scope
+        self.requests = 0
+        self.questions = 0
+        self.cached = 0
+        self.failed = 0
+        self._pending = []
+        self._pending_tokens = 0
+        self._oldest = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cleanup")
+        self._flusher = threading.Thread(target=self._flush_loop, name="cleanup-flusher", daemon=True)
+        self._flusher.start()
+
+    def _cache_key(self, item):
+        model, version = self.cache_scope
+        return self.cache.key(model, version, json.dumps(item, sort_keys=True))
+
+    def submit(self, job_id, questions_by_event):
+        """
+        Queues one file's questions for cleanup.
+
+        Args:
+            job_id: Identifier unique within this run (e.g. the job index).
+            questions_by_event (dict): {event: [question dicts]} as extracted.
+
+        Returns:
+            Future: Resolves to the cleaned {event: [questions]} dict.
+        """
+        state = {
+            'result': copy.deepcopy(questions_by_event),
+            'remaining': 0,
+            'future': Future(),
+        }
+        items = []
+        for event, questions in state['result'].items():
+            if not isinstance(questions, list):
+                continue
+            for question in questions:
+                if not isinstance(question, dict):
+                    continue
+                item_id = f"{job_id}-{len(items)}"
+                item = {field: question[field] for field in REVIEW_FIELDS if field in question}
+                items.append((item_id, item, question))
+
+        to_send = []
+        for item_id, item, question in items:
+            if self.cache is not None:
+                cached = self.cache.get(self._cache_key(item))
+                if cached is not None:
+                    _apply_verdict(question, json.loads(cached))
+                    self.cached += 1
+                    continue
+            to_send.append((item_id, item, question, state))
+
+        with self._condition:
+            state['remaining'] = len(to_send)
+            if not to_send:
+                state['future'].set_result(state['result'])
+                return state['future']
+            for entry in to_send:
+                self._pending.append(entry)
+                self._pending_tokens += estimate_tokens(json.dumps(entry[1]))
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            while self._pending_tokens >= self.max_tokens:
+                self._flush_locked()
+            self._condition.notify_all()
+        return state['future']
+
+    def _flush_loop(self):
+        with self._condition:
+            while not self._closed:
+                if self._pending and time.monotonic() - self._oldest >= self.max_wait:
+                    self._flush_locked()
+                    continue
+                timeout = self.max_wait if not self._pending else max(0.0, self._oldest + self.max_wait - time.monotonic())
+                self._condition.wait(timeout=timeout)
+            while self._pending:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        """Sends up to max_tokens worth of pending questions as one batch. Caller holds the lock."""
+        batch = []
+        tokens = 0
+        while self._pending:
+            entry_tokens = estimate_tokens(json.dumps(self._pending[0][1]))
+            if batch and tokens + entry_tokens > self.max_tokens:
+                break
+            batch.append(self._pending.pop(0))
+            tokens += entry_tokens
+        self._pending_tokens -= tokens
+        self._oldest = time.monotonic() if self._pending else None
+        self.requests += 1
+        self.questions += len(batch)
+        self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            verdicts = self.clean_fn([{'id': item_id, **item} for item_id, item, _, _ in batch])
+            by_id = {v.get('id'): v for v in verdicts or [] if isinstance(v, dict)}
+        except Exception as e:
+            if len(batch) > 1:
+                print(f"Cleanup batch of {len(batch)} questions failed ({e}), retrying it in halves")
+                with self._condition:
+                    self.requests += 2
+                middle = len(batch) // 2
+                self._run_batch(batch[:middle])
+                self._run_batch(batch[middle:])
+                return
+            print(f"Cleanup of question {batch[0][0]} failed, keeping it as extracted: {e}")
+            with self._condition:
+                self.failed += 1
+            by_id = {}
+
+        for item_id, item, question, state in batch:
+            verdict = by_id.get(item_id)
+            if verdict is not None:
+                _apply_verdict(question, verdict)
+                if self.cache is not None:
+                    self.cache.put(self._cache_key(item), json.dumps(verdict))
+            with self._condition:
+                state['remaining'] -= 1
+                if state['remaining'] == 0 and not state['future'].done():
+                    state['future'].set_result(state['result'])
+
+    def stats(self):
+        with self._condition:
+            return {'requests': self.requests, 'questions': self.questions, 'cached': self.cached, 'failed': self.failed}
+
+    def close(self):
+        """Sends whatever is still pending and waits for all batches to finish."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._flusher.join()
+        self._executor.shutdown(wait=True)
+
+
+def _apply_verdict(question, verdict):
+    if 'answers' in verdict:
+        question['answers'] = verdict['answers']
+    if 'difficulty' in verdict:
+        question['difficulty'] = verdict['difficulty']
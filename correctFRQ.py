@@ -1,21 +1,19 @@
 import json
-import google.generativeai as genai
-import random
 from joblib import Parallel, delayed
+from gemini_pool import GeminiPool
 
 
 GEMINI_API_KEYS = []
+# Shared across the evaluation threads so each key stays within its rate limits
+gemini_pool = GeminiPool(GEMINI_API_KEYS)
 def call_gemini(prompt: str) -> str:
     """
-    Calls the Gemini 2 API with the provided prompt using one of the API keys.
+    Calls the Gemini 2 API with the provided prompt using the least-loaded API key.
     Returns the response text.
     """
     print('calling')
-    api_key = random.choice(GEMINI_API_KEYS)
-    genai.configure(api_key=api_key)
     try:
-        # Using the Gemini 2.0 flash experiment model.
-        response = genai.GenerativeModel("gemini-1.5-flash").generate_content(prompt)
+        response = gemini_pool.generate(prompt, model="gemini-1.5-flash")
         if response and hasattr(response, 'text'):
             return response.text.strip()
         else:
@@ -52,8 +50,8 @@ def process_test_entry(test_entry: dict) -> dict:
     """
     filtered_entry = {}
     for subject, questions in test_entry.items():
-        # Evaluate all questions in parallel.
-        results = Parallel(n_jobs=-1)(
+        # Evaluate all questions in parallel. Threads share the key pool's budgets.
+        results = Parallel(n_jobs=8, prefer="threads")(
             delayed(evaluate_question)(q) for q in questions
         )
         # Keep only the questions where Gemini returned YES.
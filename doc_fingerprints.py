@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+from collections import Counter
+from manifest import file_version
+from minhash import LSHIndex, normalize_text, shingles, signature
+
+
+class DocumentIndex:
+    """
+    Near-duplicate detection for ingested documents.
+
+    Every document's text is normalized, cut into word shingles and reduced to a MinHash
+    signature. A document whose signature nearly matches one already ingested (the same
+    exam re-uploaded to another folder, or its answer-key version) is reported as a
+    duplicate of it so the LLM stages can be skipped.
+
+    Every entry remembers the document version (md5Checksum or modifiedTime) it was
+    computed for, and a document whose version changed is fingerprinted again. An original
+    whose extraction then fails is dropped with discard(), together with the documents
+    recorded as its duplicates. Entries are appended to a JSON-lines file (last line per id
+    wins) and reloaded on the next run.
+    """
+
+    def __init__(self, path='doc_fingerprints.jsonl', threshold=0.8, num_perm=128, bands=32, shingle_size=5):
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.lsh = LSHIndex(num_perm, bands)
+        self.duplicate_of = {}
+        self.versions = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._load(entry)
+
+    def _load(self, entry):
+        file_id = entry['id']
+        self.lsh.remove(file_id)
+        self.duplicate_of.pop(file_id, None)
+        self.versions.pop(file_id, None)
+        if entry.get('dropped'):
+            return
+        self.versions[file_id] = entry.get('version')
+        if entry.get('duplicate_of'):
+            self.duplicate_of[file_id] = entry['duplicate_of']
+        else:
+            self.lsh.add(file_id, entry['signature'])
+
+    def _append(self, entry):
+        self._load(entry)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def fingerprint(self, text):
+        return signature(shingles(normalize_text(text), self.shingle_size), self.num_perm)
+
+    def check(self, file_info, text):
+        """
+        Looks a document up in the index and adds it.
+
+        Args:
+            file_info (dict): Drive metadata with at least 'id' and 'md5Checksum' or 'modifiedTime'.
+            text (str): The document's text.
+
+        Returns:
+            tuple: (id of the document it duplicates, or None; estimated similarity)
+        """
+        file_id = file_info['id']
+        version = file_version(file_info)
+        with self._lock:
+            if file_id in self.versions and self.versions[file_id] == version:
+                if file_id in self.duplicate_of:
+                    return self.duplicate_of[file_id], 1.0
+                # Seen before as an original (e.g. a resumed file)
+                return None, 0.0
+        sig = self.fingerprint(text)
+        with self._lock:
+            # A changed document must not match what it used to be
+            self._load({'id': file_id, 'dropped': True})
+            match = self.lsh.query(sig, self.threshold)
+            if match is not None:
+                entry = {'id': file_id, 'version': version, 'duplicate_of': match[0], 'similarity': round(match[1], 3)}
+            else:
+                entry = {'id': file_id, 'version': version, 'signature': sig}
+            self._append(entry)
+        return (match[0], match[1]) if match is not None else (None, 0.0)
+
+    def is_duplicate(self, file_id):
+        """True if the document is still recorded as a duplicate (its original wasn't discarded)."""
+        with self._lock:
+            return file_id in self.duplicate_of
+
+    def discard(self, file_id):
+        """
+        Drops an original whose extraction failed, so it isn't kept as what its copies
+        duplicate, and is fingerprinted again when it is retried.
+
+        Returns:
+            list: Ids of the documents recorded as its duplicates, dropped with it; their
+            questions were never extracted.
+        """
+        with self._lock:
+            if file_id not in self.lsh.signatures:
+                return []
+            orphans = [other for other, original in self.duplicate_of.items() if original == file_id]
+            for other in [file_id] + orphans:
+                self._append({'id': other, 'dropped': True})
+            return orphans
+
+    def cluster_stats(self):
+        """Returns the number of originals and duplicates, and how large the duplicate clusters are."""
+        with self._lock:
+            sizes = Counter(self.duplicate_of.values())
+            return {
+                'documents': len(self.lsh) + len(self.duplicate_of),
+                'originals': len(self.lsh),
+                'duplicates': len(self.duplicate_of),
+                'clusters': len(sizes),
+                'largest_cluster': max(sizes.values()) + 1 if sizes else 1,
+                'cluster_sizes': dict(sorted(Counter(size + 1 for size in sizes.values()).items())),
+            }
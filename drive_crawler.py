@@ -0,0 +1,101 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from googleapiclient.errors import HttpError
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+LIST_FIELDS = "nextPageToken, files(id, name, mimeType, parents, size, modifiedTime, md5Checksum)"
+PAGE_SIZE = 1000
+
+
+def list_folder(service, folder_id, fields=LIST_FIELDS):
+    """
+    Lists every direct child of a folder with a single paginated query.
+
+    Files and subfolders come back from the same listing, so each folder costs
+    one request per page instead of one query for files plus one for subfolders.
+
+    Returns:
+        tuple: (files, subfolder_ids)
+    """
+    files = []
+    subfolders = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True,
+            q=f"'{folder_id}' in parents and trashed=false",
+            fields=fields,
+            pageSize=PAGE_SIZE,
+            pageToken=page_token,
+        ).execute(num_retries=3)
+        for item in results.get('files', []):
+            if item.get('mimeType') == FOLDER_MIME_TYPE:
+                subfolders.append(item['id'])
+            else:
+                files.append(item)
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return files, subfolders
+
+
+def crawl_drive(service, folder_ids, max_workers=8, service_factory=None, fields=LIST_FIELDS):
+    """
+    Breadth-first crawl of one or more Drive folders, yielding file dicts as they are found.
+
+    Folders are listed concurrently by a bounded pool of worker threads. Discovered
+    subfolders are queued behind the folders already waiting, so the crawl fans out
+    level by level, and files are yielded as soon as their folder's listing finishes.
+
+    Args:
+        service: A Drive v3 service (or anything exposing files().list(...).execute()).
+        folder_ids (list): Root folder ids to crawl.
+        max_workers (int): Maximum number of listings in flight at once.
+        service_factory (callable): Optional zero-argument callable returning a fresh
+            service. googleapiclient services are not thread-safe, so when given, each
+            worker thread builds and reuses its own service instead of sharing `service`.
+        fields (str): Drive fields selector for the listing.
+
+    Yields:
+        dict: File metadata for every non-folder item under the roots.
+    """
+    local = threading.local()
+
+    def get_service():
+        if service_factory is None:
+            return service
+        if not hasattr(local, 'service'):
+            local.service = service_factory()
+        return local.service
+
+    def list_one(folder_id):
+        return list_folder(get_service(), folder_id, fields)
+
+    seen = set()
+    pending = deque()
+    for folder_id in folder_ids:
+        if folder_id not in seen:
+            seen.add(folder_id)
+            pending.append(folder_id)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+        while pending or in_flight:
+            while pending and len(in_flight) < max_workers:
+                folder_id = pending.popleft()
+                in_flight[executor.submit(list_one, folder_id)] = folder_id
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                folder_id = in_flight.pop(future)
+                try:
+                    files, subfolders = future.result()
+                except HttpError as error:
+                    print(f'An error occurred listing {folder_id}: {error}')
+                    continue
+                for subfolder_id in subfolders:
+                    # Shortcuts and shared drives can link the same folder more than once
+                    if subfolder_id not in seen:
+                        seen.add(subfolder_id)
+                        pending.append(subfolder_id)
+                yield from files
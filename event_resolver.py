@@ -0,0 +1,145 @@
+import ast
+import difflib
+import json
+import os
+import re
+from collections import Counter
+
+# How a raw key was resolved
+EXACT = 'exact'
+NORMALIZED = 'normalized'
+SORTED_TOKENS = 'sorted_tokens'
+FUZZY = 'fuzzy'
+UNRESOLVED = 'unresolved'
+
+_SEPARATORS = re.compile(r"[\s_\-–—/:;,.()\[\]'\"]+")
+# Section labels Gemini tacks onto event names
+_SUFFIXES = ("free response", "multiple choice", "short answer", "frq", "mcq", "questions")
+
+
+def load_events(path=None):
+    """
+    Reads the canonical event list from main.py's `events` without importing main.py,
+    which would set up its Drive and Gemini clients.
+    """
+    path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    with open(path, 'r') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == 'events' for target in node.targets):
+            return list(ast.literal_eval(node.value))
+    return []
+
+
+def normalize_key(key):
+    """Folds case, '&', punctuation, separators and trailing section labels: 'Anatomy_Respiratory - FRQ' -> 'anatomy respiratory'."""
+    key = _SEPARATORS.sub(' ', str(key).lower().replace('&', ' and ')).strip()
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in _SUFFIXES:
+            if key.endswith(' ' + suffix):
+                key = key[:-len(suffix) - 1].rstrip()
+                stripped = True
+    return key
+
+
+def sort_tokens(key):
+    return ' '.join(sorted(key.split()))
+
+
+class EventResolver:
+    """
+    Maps the event keys Gemini writes to canonical event names.
+
+    A key is looked up exactly (lower-cased) in the hand-written titles map first, so every
+    mapping it has keeps working, including keys it maps to None to drop. Otherwise the key
+    is normalized (normalize_key()) and looked up in an index of the normalized titles keys
+    and canonical events, then again with its words sorted, and last fuzzy-matched against
+    the canonical events. Each distinct key is resolved once and remembered, with how often
+    it was seen, for table().
+    """
+
+    def __init__(self, titles, events, cutoff=0.85):
+        self.titles = titles
+        self.events = list(events)
+        self.cutoff = cutoff
+        self._normalized = {}
+        self._sorted = {}
+        # Earlier entries win: titles keys in their own order, then the canonical names
+        entries = list(titles.items())
+        entries += [(event, event) for event in self.events]
+        entries += [(event, event) for event in titles.values() if event is not None]
+        for key, event in entries:
+            normalized = normalize_key(key)
+            self._normalized.setdefault(normalized, event)
+            self._sorted.setdefault(sort_tokens(normalized), event)
+        self._fuzzy = {}
+        for event in self.events:
+            self._fuzzy.setdefault(normalize_key(event), event)
+        self._memo = {}
+        self.counts = Counter()
+
+    def settings(self):
+        """The inputs, besides titles, that decide how keys resolve."""
+        return {'events': self.events, 'cutoff': self.cutoff}
+
+    def _resolve(self, key):
+        if key in self.titles:
+            return self.titles[key], EXACT, 1.0
+        normalized = normalize_key(key)
+        if normalized in self._normalized:
+            return self._normalized[normalized], NORMALIZED, 1.0
+        tokens = sort_tokens(normalized)
+        if tokens in self._sorted:
+            return self._sorted[tokens], SORTED_TOKENS, 1.0
+        matches = difflib.get_close_matches(normalized, list(self._fuzzy), n=1, cutoff=self.cutoff)
+        if matches:
+            score = difflib.SequenceMatcher(None, normalized, matches[0]).ratio()
+            return self._fuzzy[matches[0]], FUZZY, round(score, 3)
+        return None, UNRESOLVED, 0.0
+
+    def resolve(self, key):
+        """
+        Resolves one raw (lower-cased) event key.
+
+        Returns:
+            tuple: (event name or None, how it was resolved). The event is None both for
+            unresolved keys and for keys titles deliberately maps to None.
+        """
+        resolution = self._memo.get(key)
+        if resolution is None:
+            resolution = self._memo[key] = self._resolve(key)
+        self.counts[key] += 1
+        return resolution[0], resolution[1]
+
+    def add_counts(self, counts):
+        """Adds the key counts of a copy() used in another process."""
+        for key, count in counts.items():
+            if key not in self._memo:
+                self._memo[key] = self._resolve(key)
+            self.counts[key] += count
+
+    def copy(self):
+        """A resolver with the same index and memo but no counts, for another process."""
+        resolver = EventResolver.__new__(EventResolver)
+        resolver.__dict__.update(self.__dict__)
+        resolver._memo = dict(self._memo)
+        resolver.counts = Counter()
+        return resolver
+
+    def table(self):
+        """
+        Returns how every key seen so far resolved, keys resolved by a fallback first, then
+        by how often they were seen.
+        """
+        order = {UNRESOLVED: 0, FUZZY: 1, SORTED_TOKENS: 2, NORMALIZED: 3, EXACT: 4}
+        keys = sorted(self.counts, key=lambda key: (order[self._memo[key][1]], -self.counts[key], key))
+        return {
+            key: {'event': self._memo[key][0], 'method': self._memo[key][1], 'score': self._memo[key][2], 'count': self.counts[key]}
+            for key in keys
+        }
+
+    def write_table(self, path='event_resolution.json'):
+        with open(path, 'w') as f:
+            json.dump(self.table(), f, indent=4)
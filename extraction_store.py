@@ -0,0 +1,289 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_DIR = 'extraction_store'
+# Shards roll over to a new file past this many compressed bytes
+MAX_SHARD_BYTES = 64 * 1024 * 1024
+EXTENSIONS = {'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+
+
+def normalize_event_key(event):
+    """Folds an event name into a directory name: 'Anatomy - Skeletal' -> 'anatomy-skeletal'."""
+    key = re.sub(r"[^a-z0-9]+", '-', str(event).lower().replace('&', ' and ')).strip('-')
+    return key or 'unknown'
+
+
+def _compress(data, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ExtractionStore:
+    """
+    Raw Gemini extractions, sharded by normalized event key and compressed.
+
+    Every event gets a directory of shard files. Each record (the questions one source file
+    yielded for one event) is appended to the event's current shard as its own gzip member
+    or zstd frame, so a record can be read back by seeking to it without decompressing the
+    rest of the shard. Next to each shard, an index file lists the source file id and
+    version, byte offset, length and question count of every record it holds, and a
+    sequence number that orders records across events the way they were written; readers
+    go through the indexes and touch only the shards and records they ask for.
+
+    Records are written before their index line, so a crash leaves at most an unindexed
+    tail that readers never see. Appending a file version that is already stored for an
+    event is a no-op, which keeps retried writes from duplicating records.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, compression=None, max_shard_bytes=MAX_SHARD_BYTES):
+        if compression is None:
+            compression = 'zstd' if zstandard is not None else 'gzip'
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.directory = directory
+        self.compression = compression
+        self.max_shard_bytes = max_shard_bytes
+        self._lock = threading.Lock()
+        self._indexes = {}
+        # (event key, file id, version) of every stored record
+        self._stored = set()
+        # Sequence number of the next record, across every event
+        self._seq = 0
+        os.makedirs(directory, exist_ok=True)
+        for event_key in os.listdir(directory):
+            if os.path.isdir(os.path.join(directory, event_key)):
+                self._load_event(event_key)
+
+    def _load_event(self, event_key):
+        """Reads every shard index of an event into {shard name: [entries]}."""
+        event_dir = os.path.join(self.directory, event_key)
+        shards = {}
+        for name in sorted(os.listdir(event_dir)):
+            if not name.endswith('.idx'):
+                continue
+            entries = []
+            with open(os.path.join(event_dir, name), 'r') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A torn final line from an interrupted write
+                        continue
+            shards[name[:-len('.idx')]] = entries
+            self._stored.update((event_key, e['file'], e.get('version')) for e in entries)
+            self._seq = max([self._seq] + [e['seq'] + 1 for e in entries if 'seq' in e])
+        self._indexes[event_key] = shards
+        return shards
+
+    def _current_shard(self, event_key):
+        """Returns the shard new records for an event go to, starting a new one when the last is full."""
+        shards = self._indexes.setdefault(event_key, {})
+        extension = EXTENSIONS[self.compression]
+        names = sorted(name for name in shards if name.endswith(extension))
+        if names:
+            path = os.path.join(self.directory, event_key, names[-1])
+            if not os.path.exists(path) or os.path.getsize(path) < self.max_shard_bytes:
+                return names[-1]
+        number = sum(1 for name in os.listdir(os.path.join(self.directory, event_key)) if not name.endswith('.idx'))
+        name = f"shard-{number:05d}{extension}"
+        shards[name] = []
+        return name
+
+    def contains(self, event, file_id, version=None):
+        """Checks whether a source file's questions for an event are already stored."""
+        return (normalize_event_key(event), file_id, version) in self._stored
+
+    def append(self, file_id, extraction, version=None):
+        """
+        Stores one source file's extraction ({event: [questions]}), one record per event.
+        Event names that fold into the same key ('Ecology' and 'ecology') share one
+        record, under the first name, with their questions in extraction order.
+
+        Returns:
+            int: The number of records written (events already stored for this version are skipped).
+        """
+        grouped = {}
+        for event, questions in extraction.items():
+            if not isinstance(questions, list):
+                continue
+            event_key = normalize_event_key(event)
+            if event_key in grouped:
+                grouped[event_key][1].extend(questions)
+            else:
+                grouped[event_key] = (event, list(questions))
+        written = 0
+        with self._lock:
+            for event_key, (event, questions) in grouped.items():
+                if self.contains(event, file_id, version):
+                    continue
+                os.makedirs(os.path.join(self.directory, event_key), exist_ok=True)
+                shard = self._current_shard(event_key)
+                record = json.dumps({'file': file_id, 'event': event, 'questions': questions}) + "\n"
+                data = _compress(record.encode('utf-8'), self.compression)
+                path = os.path.join(self.directory, event_key, shard)
+                with open(path, 'ab') as f:
+                    offset = f.tell()
+                    f.write(data)
+                entry = {'file': file_id, 'version': version, 'offset': offset, 'length': len(data), 'count': len(questions), 'seq': self._seq}
+                self._seq += 1
+                with open(path + '.idx', 'a') as f:
+                    f.write(json.dumps(entry) + "\n")
+                self._indexes[event_key][shard].append(entry)
+                self._stored.add((event_key, file_id, version))
+                written += 1
+        return written
+
+    def events(self):
+        """Returns the normalized event keys that have records."""
+        return sorted(key for key, shards in self._indexes.items() if any(shards.values()))
+
+    def index(self, event=None):
+        """
+        Lists index entries, optionally for one event only.
+
+        Returns:
+            list: (event key, shard name, entry dict) tuples.
+        """
+        keys = [normalize_event_key(event)] if event is not None else self.events()
+        return [
+            (key, shard, entry)
+            for key in keys
+            for shard, entries in sorted(self._indexes.get(key, {}).items())
+            for entry in entries
+        ]
+
+    def records(self, events=None, files=None, latest_only=True, in_order=False):
+        """
+        Yields stored records, reading only the shards of the requested events and only the
+        records of the requested source files.
+
+        Args:
+            events (iterable): Event names or keys to read, or None for all.
+            files (iterable): Source file ids to read, or None for all.
+            latest_only (bool): Skip records superseded by a later version of the same file.
+            in_order (bool): Yield records in the order they were written, across events,
+                instead of event by event. Records written before sequence numbers were
+                stored come first.
+
+        Yields:
+            dict: {'file', 'event', 'questions'}
+        """
+        keys = self.events() if events is None else sorted({normalize_event_key(e) for e in events})
+        files = set(files) if files is not None else None
+        wanted = []
+        for key in keys:
+            shards = sorted(self._indexes.get(key, {}).items())
+            latest = {}
+            if latest_only:
+                for shard, entries in shards:
+                    for entry in entries:
+                        latest[entry['file']] = id(entry)
+            for shard, entries in shards:
+                for entry in entries:
+                    if (files is None or entry['file'] in files) and (not latest_only or latest[entry['file']] == id(entry)):
+                        wanted.append((key, shard, entry))
+            if not in_order:
+                yield from self._read(wanted)
+                wanted = []
+        if in_order:
+            wanted.sort(key=lambda item: item[2].get('seq', -1))
+            yield from self._read(wanted)
+
+    def _read(self, wanted):
+        """Reads the records of (event key, shard name, entry) tuples, keeping each shard open while it is used."""
+        handles = {}
+        try:
+            for key, shard, entry in wanted:
+                f = handles.get((key, shard))
+                if f is None:
+                    f = handles[(key, shard)] = open(os.path.join(self.directory, key, shard), 'rb')
+                compression = 'zstd' if shard.endswith(EXTENSIONS['zstd']) else 'gzip'
+                f.seek(entry['offset'])
+                yield json.loads(_decompress(f.read(entry['length']), compression))
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def import_bank(self, bank_path):
+        """
+        Loads an existing JSON-lines bank (one extraction per line) into the store. Lines
+        have no source file id, so each is stored as 'line-<number>'.
+
+        Returns:
+            tuple: (lines imported, lines that could not be parsed)
+            Lines imported by an earlier call are skipped and not counted.
+        """
+        imported = failed = 0
+        with open(bank_path, 'r') as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    extraction = json.loads(line)
+                except json.JSONDecodeError:
+                    failed += 1
+                    continue
+                if isinstance(extraction, dict) and self.append(f'line-{number}', extraction):
+                    imported += 1
+        return imported, failed
+
+    def stats(self):
+        """Returns record, question, shard and byte counts per event."""
+        stats = {}
+        for key in self.events():
+            shards = self._indexes[key]
+            stats[key] = {
+                'records': sum(len(entries) for entries in shards.values()),
+                'questions': sum(e['count'] for entries in shards.values() for e in entries),
+                'shards': len(shards),
+                'bytes': sum(os.path.getsize(os.path.join(self.directory, key, shard)) for shard in shards),
+            }
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, query or fill the sharded extraction store.")
+    parser.add_argument('--dir', default=DEFAULT_DIR, help="store directory")
+    parser.add_argument('--compression', choices=sorted(EXTENSIONS), help="compression for new shards (default: zstd if installed)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats', help="show records, questions and size per event")
+    load = sub.add_parser('import', help="load a JSON-lines bank such as beta_bank.json")
+    load.add_argument('bank', help="path of the bank to import")
+    query = sub.add_parser('query', help="print stored records as JSON lines")
+    query.add_argument('--event', action='append', help="only this event (repeatable)")
+    query.add_argument('--file', action='append', help="only this source file id (repeatable)")
+    args = parser.parse_args()
+
+    store = ExtractionStore(args.dir, compression=args.compression)
+    if args.command == 'stats':
+        total_questions = 0
+        for key, stats in store.stats().items():
+            total_questions += stats['questions']
+            print(f"{key:<45}{stats['records']:>8} records{stats['questions']:>8} questions{stats['bytes'] / 1024:>10.1f} KiB")
+        print(f"{total_questions} questions in {len(store.events())} events")
+    elif args.command == 'import':
+        imported, failed = store.import_bank(args.bank)
+        print(f"Imported {imported} extractions ({failed} unparseable lines skipped)")
+    else:
+        for record in store.records(events=args.event, files=args.file):
+            print(json.dumps(record))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import re
+import threading
+from collections import Counter, namedtuple
+
+SUPPORTED_MIME_TYPES = frozenset([
+    'application/pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.google-apps.document',
+])
+
+# Build and lab events have no written questions worth extracting
+BUILD_EVENT = re.compile(r"experiment|road|( map )|statemap|forestry|widi|write it|tower|scrambler|robot|trajectory|helicopter|electric|bungee")
+# Answer keys, answer sheets and other non-test documents
+NOT_A_TEST = re.compile(r"key|sheet|answer|result|image|response|checklist|distribution")
+
+# Reason codes
+ACCEPTED = 'accepted'
+NO_NAME = 'no_name'
+UNSUPPORTED_TYPE = 'unsupported_type'
+BUILD_EVENT_NAME = 'build_event'
+NOT_A_TEST_NAME = 'not_a_test'
+REASONS = (ACCEPTED, NO_NAME, UNSUPPORTED_TYPE, BUILD_EVENT_NAME, NOT_A_TEST_NAME)
+
+Decision = namedtuple('Decision', ['accept', 'reason', 'match'])
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+
+
+def _decide(name, mimeType):
+    if not name:
+        return Decision(False, NO_NAME, None)
+    if mimeType is not None and mimeType not in SUPPORTED_MIME_TYPES:
+        return Decision(False, UNSUPPORTED_TYPE, mimeType)
+    lowered = name.lower()
+    # "no answer" exempts a name from the build-event rule only, as before; such names
+    # still contain "answer" and are rejected here first
+    match = NOT_A_TEST.search(lowered)
+    if match:
+        return Decision(False, NOT_A_TEST_NAME, match.group(0))
+    if "no answer" not in lowered:
+        match = BUILD_EVENT.search(lowered)
+        if match:
+            return Decision(False, BUILD_EVENT_NAME, match.group(0))
+    return Decision(True, ACCEPTED, None)
+
+
+def classify(name, mimeType=None):
+    """
+    Decides whether a Drive file looks like a written test worth downloading.
+
+    Args:
+        name (str): The file's Drive title.
+        mimeType (str): The file's MIME type, or None to judge by name alone.
+
+    Returns:
+        Decision: (accept, reason, match), where reason is one of REASONS and match is the
+        text that triggered a rejection.
+    """
+    decision = _decide(name, mimeType)
+    with _counts_lock:
+        _counts[decision.reason] += 1
+        if decision.match is not None:
+            _counts[decision.reason, decision.match] += 1
+    return decision
+
+
+def hit_counts():
+    """Returns how often each rule (and each matched term, as 'reason:term') has fired."""
+    with _counts_lock:
+        return {key if isinstance(key, str) else ':'.join(key): count for key, count in _counts.items()}
+
+
+def reset_counts():
+    with _counts_lock:
+        _counts.clear()
@@ -0,0 +1,205 @@
+import random
+import threading
+import time
+from collections import deque
+from metrics import add_usage
+
+# Free-tier limits for gemini-2.0-flash, per key
+DEFAULT_RPM = 15
+DEFAULT_TPM = 1_000_000
+WINDOW = 60.0
+
+
+def estimate_tokens(text):
+    """Rough token count used for budgeting (about four characters per token)."""
+    return len(text) // 4 + 1 if text else 0
+
+
+def is_rate_limit_error(error):
+    """Checks whether an exception from either Gemini SDK is a 429 / quota error."""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if code == 429:
+        return True
+    message = str(error).lower()
+    return '429' in message or 'resource_exhausted' in message or 'resource exhausted' in message or 'quota' in message
+
+
+class KeyState:
+    """Usage bookkeeping for one API key."""
+
+    def __init__(self, key):
+        self.key = key
+        self.requests = deque()  # start times of requests in the current window
+        self.tokens = deque()  # (time, tokens) for requests in the current window
+        self.token_total = 0
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.rate_limited = 0
+        self.errors = 0
+        self.calls = 0
+
+    def expire(self, now):
+        while self.requests and self.requests[0] <= now - WINDOW:
+            self.requests.popleft()
+        while self.tokens and self.tokens[0][0] <= now - WINDOW:
+            self.token_total -= self.tokens.popleft()[1]
+
+    def available_at(self, now, tokens, rpm, tpm):
+        """Earliest time this key could take a request of the given size."""
+        at = max(now, self.cooldown_until)
+        if len(self.requests) >= rpm:
+            at = max(at, self.requests[len(self.requests) - rpm] + WINDOW)
+        if self.tokens and self.token_total + tokens > tpm:
+            # Wait until enough old requests leave the window to fit this one
+            freed = self.token_total
+            for t, n in self.tokens:
+                freed -= n
+                if freed + tokens <= tpm:
+                    at = max(at, t + WINDOW)
+                    break
+            else:
+                # Bigger than the whole budget: let it through once the window is empty
+                at = max(at, self.tokens[-1][0] + WINDOW)
+        return at
+
+    def load(self, rpm):
+        return self.in_flight + len(self.requests) / rpm
+
+
+class KeyPool:
+    """
+    Shares a set of API keys between threads while keeping each key inside its rate limits.
+
+    Every call goes to the least-loaded key that has request and token budget left in the
+    current minute. Keys that return 429/quota errors are cooled down and the call moves to
+    another key; other errors are retried with exponential backoff and full jitter, up to
+    max_retries attempts.
+    """
+
+    def __init__(self, keys, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=5, base_delay=2.0,
+                 max_delay=60.0, cooldown=60.0, clock=time.monotonic, sleep=time.sleep):
+        self.keys = [KeyState(key) for key in keys]
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cooldown = cooldown
+        self.clock = clock
+        self.sleep = sleep
+        self._condition = threading.Condition()
+
+    def acquire(self, tokens=0):
+        """Blocks until a key has budget for a request of `tokens` tokens, then reserves it."""
+        if not self.keys:
+            raise ValueError("No Gemini API keys configured")
+        with self._condition:
+            while True:
+                now = self.clock()
+                best = None
+                wake_at = None
+                for state in self.keys:
+                    state.expire(now)
+                    at = state.available_at(now, tokens, self.rpm, self.tpm)
+                    if at <= now:
+                        if best is None or state.load(self.rpm) < best.load(self.rpm):
+                            best = state
+                    elif wake_at is None or at < wake_at:
+                        wake_at = at
+                if best is not None:
+                    best.requests.append(now)
+                    best.tokens.append((now, tokens))
+                    best.token_total += tokens
+                    best.in_flight += 1
+                    best.calls += 1
+                    return best
+                self._condition.wait(timeout=min(1.0, max(0.01, wake_at - now)))
+
+    def release(self, state, error=None):
+        """Returns a key to the pool, cooling it down if the call was rate limited."""
+        with self._condition:
+            state.in_flight -= 1
+            if error is not None:
+                state.errors += 1
+                if is_rate_limit_error(error):
+                    state.rate_limited += 1
+                    state.cooldown_until = self.clock() + self.cooldown
+            self._condition.notify_all()
+
+    def call(self, fn, tokens=0, usage=None):
+        """
+        Calls fn(key) on the best available key, retrying failures.
+
+        Args:
+            fn (callable): Makes the request with the given API key and returns its result.
+            tokens (int): Estimated tokens the request will use, for the per-key token budget.
+            usage (dict): Optional per-job counters; retries are added under 'retries'.
+
+        Returns:
+            Whatever fn returns.
+
+        Raises:
+            The last error once max_retries attempts have failed.
+        """
+        attempt = 0
+        while True:
+            state = self.acquire(tokens)
+            try:
+                result = fn(state.key)
+            except Exception as e:
+                self.release(state, e)
+                attempt += 1
+                if attempt >= self.max_retries:
+                    raise
+                if usage is not None:
+                    add_usage(usage, retries=1)
+                if is_rate_limit_error(e):
+                    print(f"Key ...{state.key[-4:]} rate limited, cooling down for {self.cooldown}s")
+                    continue
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                print(f"Gemini error ({e}), retrying in {delay:.1f}s")
+                self.sleep(delay)
+                continue
+            self.release(state)
+            return result
+
+    def stats(self):
+        """Returns per-key call, error and rate-limit counts."""
+        with self._condition:
+            return {
+                f"...{state.key[-4:]}": {
+                    'calls': state.calls,
+                    'errors': state.errors,
+                    'rate_limited': state.rate_limited,
+                    'in_flight': state.in_flight,
+                }
+                for state in self.keys
+            }
+
+
+class GeminiPool(KeyPool):
+    """KeyPool that also keeps one google-genai client per key."""
+
+    def __init__(self, keys, client_factory=None, **kwargs):
+        super().__init__(keys, **kwargs)
+        self.client_factory = client_factory
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+    def client(self, key):
+        with self._clients_lock:
+            if key not in self._clients:
+                if self.client_factory is not None:
+                    self._clients[key] = self.client_factory(key)
+                else:
+                    from google import genai
+                    self._clients[key] = genai.Client(api_key=key)
+            return self._clients[key]
+
+    def generate(self, prompt, model='gemini-2.0-flash', config=None, usage=None):
+        """Sends prompt to the model on the least-loaded healthy key and returns the response."""
+        return self.call(
+            lambda key: self.client(key).models.generate_content(model=model, contents=prompt, config=config),
+            tokens=estimate_tokens(prompt),
+            usage=usage,
+        )
@@ -0,0 +1,174 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import manifest
+from manifest import file_version
+
+# Per-file states, in the order a file moves through them
+DISCOVERED = 'discovered'
+DOWNLOADED = 'downloaded'
+EXTRACTED = 'extracted'
+CLEANED = 'cleaned'
+WRITTEN = 'written'
+STATES = (DISCOVERED, DOWNLOADED, EXTRACTED, CLEANED, WRITTEN)
+
+
+class JobQueue:
+    """
+    Crash-safe record of where every file of an ingestion run has got to.
+
+    Each file is a row in a SQLite database whose state only moves forward through
+    STATES, together with what the finished stages produced (the text cache key, the raw
+    extraction and the cleaned result), so a resumed run restarts every file from its last
+    completed stage. Every transition is its own committed transaction.
+
+    Appends to the bank are made exactly once: the bank's length is committed before a
+    result is appended, and recover() later either confirms the append (the line is there
+    in full) or truncates the bank back to that length so the result is written again.
+    """
+
+    def __init__(self, path='ingest_queue.sqlite'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, version TEXT, file_info TEXT NOT NULL, state TEXT NOT NULL,"
+            " text_key TEXT, raw_output TEXT, result TEXT, outcome TEXT,"
+            " bank_offset INTEGER, seq INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    def _update(self, file_id, **fields):
+        fields['updated'] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), file_id))
+            self._conn.commit()
+
+    def discover(self, file_info):
+        """Adds a file in the DISCOVERED state (restarting it if its contents changed)."""
+        with self._lock:
+            seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs").fetchone()[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, version, file_info, state, seq, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (file_info['id'], file_version(file_info), json.dumps(file_info), DISCOVERED, seq, time.time()),
+            )
+            self._conn.commit()
+
+    def is_known(self, file_info):
+        """Checks whether this version of a file is already queued (in any state)."""
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM jobs WHERE id = ?", (file_info['id'],)).fetchone()
+        return row is not None and row[0] == file_version(file_info)
+
+    def downloaded(self, file_id, text_key):
+        self._update(file_id, state=DOWNLOADED, text_key=text_key)
+
+    def extracted(self, file_id, raw_output):
+        self._update(file_id, state=EXTRACTED, raw_output=raw_output)
+
+    def cleaned(self, file_id, result):
+        self._update(file_id, state=CLEANED, result=result)
+
+    def begin_write(self, file_id, bank_offset):
+        """Commits the bank's length before a file's result is appended to it."""
+        self._update(file_id, bank_offset=bank_offset)
+
+    def written(self, file_id, outcome):
+        """Marks a file finished; its result, if any, is in the bank."""
+        self._update(file_id, state=WRITTEN, outcome=outcome)
+
+    def pending(self):
+        """
+        Yields every unfinished file, in discovery order.
+
+        Yields:
+            tuple: (file_info, state, text_key, raw_output, result)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_info, state, text_key, raw_output, result FROM jobs WHERE state != ? ORDER BY seq",
+                (WRITTEN,),
+            ).fetchall()
+        for file_info, state, text_key, raw_output, result in rows:
+            yield json.loads(file_info), state, text_key, raw_output, result
+
+    def finished(self):
+        """Returns (file_info, outcome) for every file that reached WRITTEN."""
+        with self._lock:
+            rows = self._conn.execute("SELECT file_info, outcome FROM jobs WHERE state = ?", (WRITTEN,)).fetchall()
+        return [(json.loads(file_info), outcome) for file_info, outcome in rows]
+
+    def recover(self, bank_path):
+        """
+        Settles appends a crash may have interrupted.
+
+        A result whose line is in the bank in full is marked WRITTEN; otherwise the bank is
+        truncated back to where that line started, leaving the file CLEANED to be written
+        again.
+
+        Returns:
+            list: (file_info, outcome) of files confirmed written.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, file_info, result, bank_offset FROM jobs WHERE state != ? AND bank_offset IS NOT NULL",
+                (WRITTEN,),
+            ).fetchall()
+        confirmed = []
+        for file_id, file_info, result, offset in rows:
+            line = ((result or '') + "\n").encode('utf-8')
+            size = os.path.getsize(bank_path) if os.path.exists(bank_path) else 0
+            if size >= offset + len(line):
+                with open(bank_path, 'rb') as f:
+                    f.seek(offset)
+                    landed = f.read(len(line)) == line
+            else:
+                landed = False
+            if landed:
+                self._update(file_id, state=WRITTEN, outcome=manifest.EXTRACTED, bank_offset=None)
+                confirmed.append((json.loads(file_info), manifest.EXTRACTED))
+                continue
+            if offset < size:
+                print(f"Truncating {bank_path} from {size} to {offset} bytes (partial write of {file_id})")
+                with open(bank_path, 'r+b') as f:
+                    f.truncate(offset)
+            self._update(file_id, bank_offset=None)
+        return confirmed
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def reset(self):
+        """Forgets every file and the crawl's progress, for a fresh run."""
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.commit()
+
+    def counts(self):
+        """Returns the number of files in each state."""
+        counts = {state: 0 for state in STATES}
+        with self._lock:
+            for state, count in self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+                counts[state] = count
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,163 @@
+import json
+import re
+from collections import namedtuple
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"\s*")
+# Strings (closed or running off the end of the text) and the structural characters
+# between them, so skipping a broken value never looks inside string contents
+_STRUCTURE = re.compile(r'(?P<string>"(?:[^"\\]|\\.)*")|(?P<open>")|[{}\[\],]', re.DOTALL)
+
+Salvage = namedtuple('Salvage', ['complete', 'questions', 'dropped', 'parsed_chars', 'total_chars'])
+
+
+def _skip_ws(text, pos):
+    return _WHITESPACE.match(text, pos).end()
+
+
+_CLOSERS = {'}': '{', ']': '['}
+
+
+def _skip_value(text, pos):
+    """
+    Finds where a (possibly malformed) array element starting at pos ends: the index of
+    the ',' or closing bracket that follows it. Returns None if the text runs out first.
+
+    Brackets are matched on a stack, so a wrong closing bracket (`[1}`) closes the
+    nearest bracket it matches instead of leaving the count off by one. Inside an object,
+    a ',' followed by '{' (never valid there) starts the next element, and a ']' with no
+    '[' open closes the array itself.
+    """
+    stack = []
+    for match in _STRUCTURE.finditer(text, pos):
+        if match.group('string') is not None:
+            continue
+        if match.group('open') is not None:
+            return None
+        char = match.group(0)
+        if char in '{[':
+            stack.append(char)
+        elif char in '}]':
+            if not stack:
+                return match.start()
+            if _CLOSERS[char] not in stack:
+                # A ']' inside an unclosed object: the array's own end
+                return match.start()
+            while stack.pop() != _CLOSERS[char]:
+                pass
+        elif not stack:
+            return match.start()
+        elif stack[-1] == '{' and text.startswith('{', _skip_ws(text, match.end())):
+            # The object was never closed and the next element starts here
+            return match.start()
+    return None
+
+
+def _salvage_array(text, pos, items):
+    """
+    Collects the object elements of the array whose '[' is just before pos.
+
+    Returns:
+        tuple: (position after the array or None if the text ended inside it, dropped elements)
+    """
+    dropped = 0
+    while True:
+        pos = _skip_ws(text, pos)
+        if pos >= len(text):
+            return None, dropped
+        char = text[pos]
+        if char == ']':
+            return pos + 1, dropped
+        if char == ',':
+            pos += 1
+            continue
+        try:
+            value, pos = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            end = _skip_value(text, pos)
+            dropped += 1
+            if end is None:
+                return None, dropped
+            # A stray closing bracket is skipped so the walk always moves forward
+            pos = end if end > pos else pos + 1
+            continue
+        # Only objects are questions
+        if isinstance(value, dict):
+            items.append(value)
+        else:
+            dropped += 1
+
+
+def salvage_json(text):
+    """
+    Parses the JSON object in a Gemini response, recovering what it can from a broken one.
+
+    Well-formed responses are parsed as a whole. Otherwise the top-level object is walked
+    once, key by key: every array element that parses on its own is kept, a malformed
+    element is skipped, and parsing stops at the first value the text ends inside, so a
+    truncated response loses only its trailing partial object. Each character is decoded
+    or scanned a bounded number of times, so the cost stays linear in the response size.
+
+    Args:
+        text (str): The raw response, possibly wrapped in prose or code fences.
+
+    Returns:
+        tuple: (dict of recovered values or None, Salvage report)
+    """
+    text = text or ""
+    start = text.find('{')
+    end = text.rfind('}')
+    if start == -1:
+        return None, Salvage(False, 0, 0, 0, len(text))
+    if end > start:
+        try:
+            data = json.loads(text[start:end + 1])
+            if isinstance(data, dict):
+                count = sum(len(v) for v in data.values() if isinstance(v, list))
+                return data, Salvage(True, count, 0, end + 1 - start, len(text))
+        except json.JSONDecodeError:
+            pass
+
+    data = {}
+    dropped = 0
+    complete = False
+    pos = start + 1
+    while True:
+        pos = _skip_ws(text, pos)
+        if pos >= len(text):
+            break
+        if text[pos] == '}':
+            complete = True
+            pos += 1
+            break
+        if text[pos] == ',':
+            pos += 1
+            continue
+        try:
+            key, pos = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        pos = _skip_ws(text, pos)
+        if not isinstance(key, str) or text[pos:pos + 1] != ':':
+            break
+        pos = _skip_ws(text, pos + 1)
+        if text[pos:pos + 1] == '[':
+            # A repeated event key extends the questions already recovered for it
+            items = data.get(key)
+            if not isinstance(items, list):
+                items = data[key] = []
+            pos, skipped = _salvage_array(text, pos + 1, items)
+            dropped += skipped
+            if pos is None:
+                pos = len(text)
+                break
+        else:
+            try:
+                data[key], pos = _decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                dropped += 1
+                break
+    count = sum(len(v) for v in data.values() if isinstance(v, list))
+    if not data:
+        return None, Salvage(False, 0, dropped, pos - start, len(text))
+    return data, Salvage(complete and dropped == 0, count, dropped, pos - start, len(text))
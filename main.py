@@ -5,16 +5,32 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.http import MediaIoBaseDownload
 import time
-import random
 import string
 import docx
-import re
 import io
 import os
-from pdfminer.high_level import extract_text
-from google import genai
+import tempfile
 import json
-from joblib import Parallel, delayed
+import shutil
+import threading
+from drive_crawler import crawl_drive
+from manifest import Manifest, EXTRACTED, FAILED, TOO_SHORT, DUPLICATE, file_version
+from pipeline import Job, Stage, run_pipeline
+from gemini_pool import GeminiPool
+from response_cache import ResponseCache
+from text_cache import TextCache, text_cache_key, bytes_key
+from text_extract import extract_pdf_pages, extraction_settings, pages_to_text, DEFAULT_BACKEND
+from chunking import split_into_chunks, merge_question_sets
+from json_salvage import salvage_json
+from concurrent.futures import ThreadPoolExecutor
+from cleanup_batcher import CleanupBatcher
+from filename_rules import classify, hit_counts
+from doc_fingerprints import DocumentIndex
+from metrics import Metrics, add_usage
+from job_queue import JobQueue
+from extraction_store import ExtractionStore
+from itertools import chain
+import argparse
 
 # All SciOly test banks
 # '1lhyd0Svy-JQlZEGEjPPB2q6qK2AC7yJH', '1vqu1dY89xBqqZxI9rdYYvlrghVQnMKAe', '1dh3T45cSCr6dkTllG-z05Sncfdtypy-t', '1XR79OZNxdwn--E_OoBF-s2225m1BfSvN', '1SPws4xgGX8qgcm3tACbRSY5tCT4bUcSG',
@@ -117,67 +133,44 @@ def authenticate_google_drive():
     except HttpError as error:
         print(f'An error occurred: {error}')
         return None
-def list_pdf_files_in_folder(service, folder_id):
-    """Retrieves a list of all PDF file dictionaries (id, name) from a Google Drive folder and its subfolders."""
-    pdf_files = []
-    try:
-        results = service.files().list(supportsAllDrives=True, includeItemsFromAllDrives=True, q=f"'{folder_id}' in parents and trashed=false", fields="nextPageToken, files(id, name, mimeType)").execute()
-        print(folder_id,results)
-        items = results.get('files', [])
-        pdf_files.extend(items)
-
-        # Retrieve subfolders
-        subfolder_query = f"'{folder_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        subfolder_results = service.files().list(supportsAllDrives=True, includeItemsFromAllDrives=True, q=subfolder_query, fields="nextPageToken, files(id)").execute()
-        subfolders = subfolder_results.get('files', [])
-
-        for subfolder in subfolders:
-            pdf_files.extend(list_pdf_files_in_folder(service, subfolder['id']))
-
-        nextPageToken = results.get('nextPageToken')
-        while nextPageToken:
-            results = service.files().list(supportsAllDrives=True, includeItemsFromAllDrives=True, q=subfolder_query, fields="nextPageToken, files(id, name)", pageToken=nextPageToken).execute()
-            items = results.get('files', [])
-            pdf_files.extend(items)
-            nextPageToken = results.get('nextPageToken')
-
-        subfolder_nextPageToken = subfolder_results.get('nextPageToken')
-        while subfolder_nextPageToken:
-            subfolder_results = service.files().list(supportsAllDrives=True, includeItemsFromAllDrives=True, q=subfolder_query, fields="nextPageToken, files(id, mimeType)", pageToken=subfolder_nextPageToken).execute()
-            subfolders = subfolder_results.get('files', [])
-            for subfolder in subfolders:
-                pdf_files.extend(list_pdf_files_in_folder(service, subfolder['id']))
-            subfolder_nextPageToken = subfolder_results.get('nextPageToken')
-    except HttpError as error:
-        print(f'An error occurred: {error}')
-    return pdf_files
+def build_drive_service():
+    """Builds a fresh Drive service from the saved token (services are not thread-safe)."""
+    return build('drive', 'v3', credentials=Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES))
+
+def download_file(service, file_id, mimeType, spool_dir=None):
+    """
+    Downloads a file from Google Drive into memory.
+
+    The file is buffered in a SpooledTemporaryFile, so it never touches disk unless it
+    grows past SPOOL_MAX_BYTES, in which case it rolls over to an anonymous, uniquely
+    named temp file in spool_dir. Together with the chunk size this bounds each worker's
+    peak memory regardless of the document's size.
 
-def download_file(service, file_id, filename, mimeType):
-    """Downloads a file from Google Drive."""
+    Returns:
+        A readable file object positioned at the start (close it when done), or None.
+    """
+    fh = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, dir=spool_dir)
     try:
         request = service.files().export_media(fileId=file_id, mimeType='application/vnd.openxmlformats-officedocument.wordprocessingml.document') if mimeType == 'application/vnd.google-apps.document' else service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
+        downloader = MediaIoBaseDownload(fh, request, chunksize=DOWNLOAD_CHUNK_SIZE)
         done = False
         while done is False:
             status, done = downloader.next_chunk()
             print(f"Download {int(status.progress() * 100)}%.")
-        with open(filename, 'wb') as f:
-            fh.seek(0)
-            f.write(fh.read())
-        return True
+        fh.seek(0)
+        return fh
     except HttpError as error:
         print(f'An error occurred: {error}')
-        return False
     except Exception as e:
         print(f"An error occured:", e)
-        return False
+    fh.close()
+    return None
 
 # --- 2. Convert PDF to Text ---
-def pdf_to_text(pdf_path):
-    """Converts a PDF file to plain text."""
+def pdf_to_text(pdf_file):
+    """Converts a PDF (a path, bytes or a binary file object) to plain text, with pages separated by form feeds."""
     try:
-        text = extract_text(pdf_path)
+        text = pages_to_text(extract_pdf_pages(pdf_file, backend=PDF_BACKEND, workers=PDF_PAGE_WORKERS))
         # if len(text) < 50:
         #     # convert to image using resolution 600 dpi 
         #     pages = convert_from_path(pdf_path, 600)
@@ -192,9 +185,10 @@ def pdf_to_text(pdf_path):
     except Exception as e:
         print(f"Error converting PDF to text: {e}")
         return None
-def docx_to_text(docx_path):
+def docx_to_text(docx_file):
+    """Converts a DOCX (a path or a binary file object) to plain text."""
     try:
-        doc = docx.Document(docx_path)
+        doc = docx.Document(docx_file)
         full_text = []
         for paragraph in doc.paragraphs:
             full_text.append(paragraph.text)
@@ -202,10 +196,34 @@ def docx_to_text(docx_path):
     except:
         print("Error getting docx")
         return None
-def extract_questions_with_gemini(text, events, idx):
-    key = GEMINI_API_KEY[random.randint(0,len(GEMINI_API_KEY)-1)]
-    print("using key: ", key)
-    client = genai.Client(api_key=key)
+def cached_generate(prompt, prompt_version, *inputs, model='gemini-2.0-flash', usage=None):
+    """
+    Sends a prompt to Gemini, answering from the response cache when the same model,
+    prompt version and inputs were seen before. Returns the response text or None.
+    Prompt/response sizes, cache hits and retries are added to the optional usage dict.
+    """
+    key = None
+    if response_cache is not None:
+        key = response_cache.key(model, prompt_version, *inputs)
+        cached = response_cache.get(key)
+        if cached is not None:
+            add_usage(usage, cache_hits=1, response_chars=len(cached))
+            return cached
+    try:
+        add_usage(usage, prompt_chars=len(prompt))
+        response = gemini_pool.generate(prompt, model=model, config={'response_mime_type': 'application/json'}, usage=usage)
+        if response and response.text:
+            add_usage(usage, response_chars=len(response.text))
+            if key is not None:
+                response_cache.put(key, response.text)
+            return response.text
+        else:
+            print("Gemini API returned an empty response.")
+            return None
+    except Exception as e:
+        print("Error interacting with Gemini API, giving up: ", e)
+        return None
+def extract_questions_with_gemini(text, events, idx, usage=None):
     prompt = f"""
     Identify the event this test most likely belongs to from the following list: {', '.join(events)}.
     Extract all multiple-choice questions and output a compressed json object of this test with a schema similar to this:
@@ -226,174 +244,388 @@ def extract_questions_with_gemini(text, events, idx):
     {text}
 
     """
-    try:
-        response = client.models.generate_content(model='gemini-2.0-flash', contents=prompt, config={'response_mime_type': 'application/json'})
-        if response:
-            return response.text
-        else:
-            print("Gemini API returned an empty response.")
-            return None
-    except Exception as e:
-        print(key, ": Error interacting with Gemini API: ", e)
-        time.sleep(8)
-        print("slept!")
-        return extract_questions_with_gemini(text, events, idx+1)
-def clean_question_with_gemini(text, idx):
-    key = GEMINI_API_KEY[random.randint(0,len(GEMINI_API_KEY)-1)]
-    client = genai.Client(api_key=key)
+    return cached_generate(prompt, EXTRACT_PROMPT_VERSION, ', '.join(events), text, usage=usage)
+def clean_batch_with_gemini(items, model='gemini-2.0-flash'):
+    """Reviews a batch of {"id", "question", ...} dicts and returns Gemini's list of verdicts."""
     prompt = f"""
-    I want you to process these questions stored in a JSON dataset based on whether they can be
+    I want you to review these questions, stored in a JSON array where every question has an "id", based on whether they can be
     solved with the question itself or not.
     If it refers to an image, diagram, figure, or a non-textual component that's not in the question itself,
-    make the answer field be an array with an empty string inside like this: [""]. This is especially prevalant when the question
-    mentions "this" without any context. Otherwise, do nothing.
-    Additionally, review the 1-indexed answer and ensure its validity, as well as the difficulty. 
-    Here's the test:
-    {text}
+    its answers should be an array with an empty string inside like this: [""]. This is especially prevalant when the question
+    mentions "this" without any context. Otherwise, keep its answers.
+    Additionally, review the 1-indexed answer and ensure its validity, as well as the difficulty.
+    Respond with a JSON array holding one object per question, {{"id": ..., "answers": [...], "difficulty": ...}}, copying each id exactly.
+    Here are the questions:
+    {json.dumps(items)}
 
     """
-    try:
-        response = client.models.generate_content(model='gemini-2.0-flash', contents=prompt, config={'response_mime_type': 'application/json'})
-        if response:
-            return response.text
-        else:
-            print("Gemini API returned an empty response.")
-            return None
-    except Exception as e:
-        print(key, ": Error interacting with Gemini API: ", e)
-        time.sleep(8)
-        print("slept!")
-        return clean_question_with_gemini(text, idx+1)
-# --- Processing function for a single PDF ---
-def process_pdf(file_info, drive_service, events, output_dir, idx_offset):
-    idx = idx_offset
-    file_mimeType = file_info['mimeType']
-    file_name = file_info['name'] + ('.docx' if file_mimeType != 'application/pdf' else '')
-    # download_name = ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(5))
-    file_id = file_info['id']
-
-    if not "no answer" in file_name.lower() and re.search(r"experiment|road|( map )|statemap|forestry|widi|write it|tower|scrambler|robot|trajectory|helicopter|electric|bungee", file_name.lower()) or re.search(r"key|sheet|answer|result|image|response|checklist|distribution", file_name.lower()):
-        print(f'{file_name} was not a pdf that contained the text "test" or "exam"')
+    response = gemini_pool.generate(prompt, model=model, config={'response_mime_type': 'application/json'})
+    verdicts = json.loads(response.text)
+    if isinstance(verdicts, dict):
+        # Sometimes the array comes wrapped in an object
+        verdicts = next((v for v in verdicts.values() if isinstance(v, list)), [])
+    return verdicts
+_batcher_lock = threading.Lock()
+def get_cleanup_batcher():
+    """Returns the shared cleanup batcher, starting it on first use."""
+    global cleanup_batcher
+    with _batcher_lock:
+        if cleanup_batcher is None:
+            cleanup_batcher = CleanupBatcher(
+                clean_batch_with_gemini,
+                max_tokens=CLEAN_BATCH_TOKENS,
+                max_wait=CLEAN_BATCH_WAIT,
+                workers=CLEAN_BATCH_WORKERS,
+                cache=response_cache,
+                cache_scope=('gemini-2.0-flash', CLEAN_PROMPT_VERSION),
+            )
+        return cleanup_batcher
+def parse_gemini_json(output, usage=None):
+    """
+    Pulls the JSON object out of a Gemini response. Every complete question is recovered
+    from a truncated or malformed response; returns None only if nothing could be.
+    """
+    parsed, salvage = salvage_json((output or "").replace('\00','f[]'))
+    if parsed is not None and not salvage.complete:
+        print(f"  Salvaged {salvage.questions} questions from a broken response ({salvage.dropped} partial or malformed objects dropped, {salvage.parsed_chars}/{salvage.total_chars} chars parsed)")
+        add_usage(usage, salvaged_responses=1, salvaged_questions=salvage.questions, dropped_objects=salvage.dropped)
+    return parsed
+def extract_questions_chunked(text, events, idx, usage=None):
+    """
+    Extracts questions from a test, splitting long ones into chunks under CHUNK_TOKENS that
+    are sent to Gemini concurrently, so responses stay short enough not to be truncated.
+    Returns the response text (merged JSON for chunked tests) or None.
+    """
+    chunks = split_into_chunks(text, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+    if len(chunks) <= 1:
+        return extract_questions_with_gemini(text, events, idx, usage)
+    print(f"Extracting questions from {len(chunks)} chunks...")
+    add_usage(usage, chunks=len(chunks))
+    with ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as executor:
+        outputs = list(executor.map(lambda chunk: extract_questions_with_gemini(chunk, events, idx, usage), chunks))
+    parsed = [parse_gemini_json(output, usage) for output in outputs]
+    parsed = [p for p in parsed if isinstance(p, dict)]
+    if len(parsed) < len(chunks):
+        print(f"  {len(chunks) - len(parsed)} of {len(chunks)} chunks failed")
+    if not parsed:
         return None
+    return json.dumps(merge_question_sets(parsed))
+# --- Pipeline stages ---
+# Each stage takes a Job and returns it; setting job.outcome ends the job early.
+_local = threading.local()
 
-    print(f"Processing file: {file_name}")
-    pdf_path = os.path.join(output_dir, file_name)
-    _, extension = os.path.splitext(file_name)
-    # if extension == '.pdf':
-    #     print(f"{file_name} is a pdf :(")
-    #     return None
+def thread_drive_service():
+    """Returns this thread's own Drive service, building it on first use."""
+    if not hasattr(_local, 'drive_service'):
+        _local.drive_service = build_drive_service()
+    return _local.drive_service
 
-    if not download_file(drive_service, file_id, pdf_path, file_mimeType):
-        print('Can\'t download file')
-        return None
+def file_name_of(file_info):
+    return file_info['name'] + ('.docx' if file_info['mimeType'] != 'application/pdf' else '')
 
-
-    print(f"Converting {file_name} to text...")
-    text_content = docx_to_text(pdf_path) if extension == ".docx" else pdf_to_text(pdf_path)
-    if os.path.exists(pdf_path):
-        os.remove(pdf_path)
-    if text_content is None or len(text_content) < 50:
+def read_download(fh, spool_dir):
+    """
+    Turns a finished download into something a worker process can receive: the bytes of
+    small files, or the path of a uniquely named temp file for ones too big to keep in memory.
+    """
+    with fh:
+        size = fh.seek(0, os.SEEK_END)
+        fh.seek(0)
+        if size <= SPOOL_MAX_BYTES:
+            return fh.read()
+        with tempfile.NamedTemporaryFile(dir=spool_dir, prefix='download-', delete=False) as spooled:
+            shutil.copyfileobj(fh, spooled)
+            return spooled.name
+
+def document_to_text(payload, extension):
+    """Converts downloaded bytes, a file object or a path to text based on the file's extension."""
+    if extension == ".docx":
+        return docx_to_text(io.BytesIO(payload) if isinstance(payload, bytes) else payload)
+    return pdf_to_text(payload)
+
+def download_stage(job, drive_service=None, output_dir=None):
+    file_name = file_name_of(job.file_info)
+    job.text_key = job.text_key or text_cache_key(job.file_info, extraction_settings(PDF_BACKEND))
+    if job.text_key is not None:
+        job.text = text_cache.get(job.text_key)
+        if job.text is not None:
+            # Seen this exact document before: skip the download and the conversion
+            print(f"Using cached text for {file_name}")
+            job.metrics['cached_text'] = True
+            return job
+    print(f"Processing file: {file_name}")
+    fh = download_file(drive_service or thread_drive_service(), job.file_info['id'], job.file_info['mimeType'], spool_dir=output_dir or OUTPUT_DIR)
+    if fh is None:
+        print('Can\'t download file')
+        job.outcome = FAILED
+        return job
+    job.payload = read_download(fh, output_dir or OUTPUT_DIR)
+    job.metrics['bytes'] = len(job.payload) if isinstance(job.payload, bytes) else os.path.getsize(job.payload)
+    if job.text_key is None and isinstance(job.payload, bytes):
+        job.text_key = bytes_key(job.payload, extraction_settings(PDF_BACKEND))
+    return job
+
+def convert_stage(job):
+    file_name = file_name_of(job.file_info)
+    _, extension = os.path.splitext(file_name)
+    try:
+        if job.text_key is not None:
+            job.text = text_cache.get(job.text_key)
+        if job.text is None:
+            print(f"Converting {file_name} to text...")
+            job.text = document_to_text(job.payload, extension)
+            if job.text is not None and job.text_key is not None:
+                text_cache.put(job.text_key, job.text)
+    finally:
+        if isinstance(job.payload, str) and os.path.exists(job.payload):
+            os.remove(job.payload)
+        job.payload = None
+    job.metrics['chars'] = len(job.text) if job.text is not None else 0
+    if job.text is None or len(job.text) < 50:
         print("too short")
-        return None
-
+        job.outcome = TOO_SHORT
+    return job
+
+def fingerprint_stage(job):
+    """Skips the Gemini stages for documents that nearly match one already ingested."""
+    if document_index is None:
+        return job
+    duplicate_of, score = document_index.check(job.file_info, job.text)
+    job.metrics['similarity'] = round(score, 3)
+    if duplicate_of is not None:
+        print(f"{file_name_of(job.file_info)} is a near-duplicate of {duplicate_of} ({score:.2f}), skipping")
+        job.outcome = DUPLICATE
+    return job
+
+def extract_stage(job):
     print(f"Extracting questions using Gemini...")
-    raw_output = extract_questions_with_gemini(text_content, events, idx)
+    raw_output = extract_questions_chunked(job.text, events, job.idx, job.metrics)
     if raw_output is None:
-        raw_output = ""
-    raw_output = raw_output.replace('\00','f[]')
-    if raw_output is None:
-        return {}
+        job.outcome = FAILED
+        return job
+    job.raw_output = raw_output.replace('\00','f[]')
+    return job
+
+def clean_stage(job):
+    """Sends the extracted questions through the shared cleanup batcher and waits for them."""
+    file_name = file_name_of(job.file_info)
+    job.outcome = FAILED
+    parsed = parse_gemini_json(job.raw_output, job.metrics)
+    if parsed is None:
+        print(f"  Error decoding Gemini JSON output for {file_name} ")
+        with open("failed.json", 'a') as writefile2:
+            writefile2.write(job.raw_output)
+        return job
     try:
-        gemini_output = clean_question_with_gemini(raw_output,idx)
-        if gemini_output is None:
-            gemini_output = ""
-        gemini_output = gemini_output.replace('\00','f[]')
-        questions_json_str = re.search(r"\{.*\}", gemini_output, re.DOTALL).group(0)
-        try:
-            parsed = json.loads(questions_json_str)
-        except:
-            try:
-                parsed = json.loads(questions_json_str+"]}")
-            except json.JSONDecodeError as e:
-                print(f"  Error decoding Gemini JSON output for {file_name} ")
-                with open("failed.json", 'a') as writefile2:
-                    writefile2.write(re.search(r"\{.*\}", gemini_output, re.DOTALL).group(0))
-                return {}
-        if questions_json_str:
-            questions_json = json.dumps(parsed)
-            return questions_json
-        else:
-            print(f"  No JSON found in Gemini output for {file_name}")
-            return {}
-
+        cleaned = get_cleanup_batcher().submit(job.idx, parsed).result()
     except Exception as e:
         print("Error!")
         print(e)
-        return {}
-
-
+        return job
+    job.result = json.dumps(cleaned)
+    job.metrics['questions'] = sum(len(q) for q in cleaned.values() if isinstance(q, list))
+    job.outcome = EXTRACTED
+    return job
 
 # --- Main Execution ---
 GOOGLE_DRIVE_CREDENTIALS_FILE = 'credentials.json'
 GEMINI_API_KEY = []
+# Shared by every thread; spreads calls across keys within each key's rate limits
+gemini_pool = GeminiPool(GEMINI_API_KEY)
+# Bump these whenever a prompt's wording changes so cached responses are not reused
+EXTRACT_PROMPT_VERSION = 1
+CLEAN_PROMPT_VERSION = 2
+RESPONSE_CACHE_FILE = 'gemini_cache.sqlite'
+# Tests longer than this are extracted in chunks, CHUNK_WORKERS at a time
+CHUNK_TOKENS = 6000
+CHUNK_OVERLAP_TOKENS = 300
+CHUNK_WORKERS = 4
+# Cleanup packs questions from many files into requests of about CLEAN_BATCH_TOKENS,
+# sending partial batches after CLEAN_BATCH_WAIT seconds
+CLEAN_BATCH_TOKENS = 8000
+CLEAN_BATCH_WAIT = 5.0
+CLEAN_BATCH_WORKERS = 4
+cleanup_batcher = None
+# Documents at least this similar (estimated Jaccard over word shingles) to one already
+# ingested are treated as re-uploads and skip the Gemini stages
+FINGERPRINT_FILE = 'doc_fingerprints.jsonl'
+DUPLICATE_THRESHOLD = 0.8
+document_index = None
+EVENTS_LOG = 'ingest_events.jsonl'
+PROMETHEUS_FILE = 'ingest_metrics.prom'
+response_cache = None
 OUTPUT_DIR = "extracted_questions"
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'token.json'
+MANIFEST_FILE = 'manifest.jsonl'
+# Per-file progress of the current run, for --resume
+QUEUE_FILE = 'ingest_queue.sqlite'
+# Extractions sharded by event, alongside beta_bank.json
+EXTRACTION_STORE_DIR = 'extraction_store'
+# Downloads stay in memory up to this size before spilling to a temp file
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Extracted text of every converted document, keyed by checksum and extraction settings (see text_cache.py)
+TEXT_CACHE_DIR = 'text_cache'
+text_cache = TextCache(TEXT_CACHE_DIR)
+# PyMuPDF when installed, otherwise pdfminer
+PDF_BACKEND = DEFAULT_BACKEND
+# Conversions already run in a process pool of CONVERT_WORKERS, one file each, so a PDF's
+# pages are not split across a second pool (text_extract.py --workers does that standalone)
+PDF_PAGE_WORKERS = 1
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# --- Initialize APIs ---
-drive_service = build('drive', 'v3', credentials=Credentials.from_authorized_user_file('token.json', ['https://www.googleapis.com/auth/drive.readonly','https://www.googleapis.com/auth/drive','https://www.googleapis.com/auth/drive.appfolder', 'https://www.googleapis.com/auth/drive.file']))
-drive_service = authenticate_google_drive()
-all_extracted_questions = {}
-
-# --- Process Folders and Files in Batches ---
-idx = 0
-with open("beta_bank.json", 'a') as writefile:
-    for folder_id in folder_links:
-        print("Looking for files in folder...")
-        all_files_in_folder = list_pdf_files_in_folder(drive_service, folder_id)
-        pdf_files_in_folder = [
-            (f
-            )
-            for f in all_files_in_folder
-            if 'name' in f
-            and (
-                 f['mimeType'] == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                 or f['mimeType'] == 'application/pdf'
-                 or f['mimeType'] == 'application/vnd.google-apps.document'
-                 )
-            and not (not "no answer" in f['name'].lower() and re.search(r"experiment|road|( map )|statemap|forestry|widi|write it|tower|scrambler|robot|trajectory|helicopter|electric|bungee", f['name'].lower()) or re.search(r"key|sheet|answer|result|image|response|checklist|distribution", f['name'].lower()))
-            ]
-        index = -1
-        for i, obj in enumerate(pdf_files_in_folder):
-            if obj.get('id') == "1DggM5EvrEI6d0Ys-aeVbsbIouU3KXYOh":
-                index = i
-                break
-        if index != -1:
-            print("found odd one out")
-            pdf_files_in_folder = pdf_files_in_folder[index + 1:]
-        
-
-
-
-        if not pdf_files_in_folder:
-            print(f"No PDF files found in folder: {folder_id}")
+# Concurrency limit for each pipeline stage
+DOWNLOAD_WORKERS = 8
+CONVERT_WORKERS = os.cpu_count() or 4
+EXTRACT_WORKERS = 5
+# Clean workers only wait on the batcher, so there can be many of them
+CLEAN_WORKERS = 32
+
+def list_stage(drive_service, folder_links, manifest, stats, queue=None):
+    """Yields a Job for every new or changed test document under the given folders."""
+    for f in crawl_drive(drive_service, folder_links, service_factory=build_drive_service):
+        decision = classify(f.get('name'), f.get('mimeType'))
+        if not decision.accept:
+            stats['filtered'] += 1
             continue
+        # Unchanged files from earlier runs don't need another download or Gemini call
+        if manifest.is_current(f):
+            stats['skipped'] += 1
+            continue
+        if queue is not None:
+            # Already queued by the run being resumed
+            if queue.is_known(f):
+                continue
+            queue.discover(f)
+        yield Job(f, stats['queued'])
+        stats['queued'] += 1
+    if queue is not None:
+        queue.set_meta('crawl_complete', '1')
+
+
+def resume_stage(queue, stats):
+    """Yields a Job for every file an interrupted run left unfinished, restored to its last completed stage."""
+    for file_info, state, text_key, raw_output, result in queue.pending():
+        job = Job(file_info, stats['queued'])
+        job.text_key = text_key
+        job.raw_output = raw_output
+        job.result = result
+        # Only clean_stage saves a result, and only once it succeeded
+        if result is not None:
+            job.outcome = EXTRACTED
+        stats['queued'] += 1
+        stats['resumed'] += 1
+        yield job
+
+
+def run(drive_service, folder_links, bank_path="beta_bank.json", resume=False):
+    """
+    Streams every new or changed document under folder_links through the pipeline into bank_path.
 
-        print(f"Processing folder: {folder_id}")
-
-        # Process files in batches of 5
-        for i in range(0, len(pdf_files_in_folder), 5):
-            batch_files = pdf_files_in_folder[i:i + 5]
-            batch_results = Parallel(n_jobs=5)(
-                delayed(process_pdf)(file_info, drive_service, events, OUTPUT_DIR, idx + j)
-                for j, file_info in enumerate(batch_files)
-            )
-
-            for result in batch_results:
-                if result:
-                    writefile.write(result + "\n")
-                    writefile.flush()
-                    print("Success!")
-            idx += len(batch_files)
\ No newline at end of file
+    With resume, files an interrupted run left unfinished continue from their last completed
+    stage, and the crawl is repeated only if it had not finished.
+    """
+    global response_cache, document_index, cleanup_batcher
+    response_cache = ResponseCache(RESPONSE_CACHE_FILE)
+    document_index = DocumentIndex(FINGERPRINT_FILE, threshold=DUPLICATE_THRESHOLD)
+    cleanup_batcher = None
+    metrics = Metrics(EVENTS_LOG, PROMETHEUS_FILE)
+
+    def record_stage(stage_name, job, seconds):
+        metrics.record(job.file_info['id'], stage_name, seconds, outcome=job.outcome, **job.metrics)
+        job.metrics = {}
+        # Checkpoint what the stage produced so a resumed run doesn't redo it. clean_stage
+        # finishes every job it succeeds on, so its result is saved whatever the outcome
+        if stage_name == "clean" and job.result is not None:
+            queue.cleaned(job.file_info['id'], job.result)
+        elif job.finished:
+            return
+        elif stage_name in ("download", "convert") and job.text is not None:
+            queue.downloaded(job.file_info['id'], job.text_key)
+        elif stage_name == "extract" and job.raw_output is not None:
+            queue.extracted(job.file_info['id'], job.raw_output)
+    manifest = Manifest(MANIFEST_FILE)
+    print(f"Manifest has {len(manifest)} processed files")
+    queue = JobQueue(QUEUE_FILE)
+    queue.recover(bank_path)
+    store = ExtractionStore(EXTRACTION_STORE_DIR)
+    # A crash can land between a file's final checkpoint and its manifest entry
+    for file_info, outcome in queue.finished():
+        if not manifest.is_current(file_info, retry_failed=False):
+            manifest.record(file_info, outcome)
+    if resume:
+        print(f"Resuming: {queue.counts()}")
+    else:
+        queue.reset()
+    stats = {'queued': 0, 'resumed': 0, 'skipped': 0, 'filtered': 0, 'written': 0}
+    stages = [
+        Stage("download", download_stage, workers=DOWNLOAD_WORKERS, skip=lambda job: job.raw_output is not None),
+        Stage("convert", convert_stage, workers=CONVERT_WORKERS, processes=True, skip=lambda job: job.payload is None),
+        # One worker: the index is shared, and checking a signature is cheap next to Gemini
+        Stage("fingerprint", fingerprint_stage, workers=1, skip=lambda job: job.raw_output is not None),
+        Stage("extract", extract_stage, workers=EXTRACT_WORKERS, skip=lambda job: job.raw_output is not None),
+        Stage("clean", clean_stage, workers=CLEAN_WORKERS, skip=lambda job: job.result is not None),
+    ]
+    with open(bank_path, 'a') as writefile:
+        def write_stage(job):
+            start = time.perf_counter()
+            file_id = job.file_info['id']
+            outcome = job.outcome or FAILED
+            if job.result:
+                outcome = EXTRACTED
+                # The store skips versions it already holds, so a resumed write can't duplicate records
+                store.append(file_id, json.loads(job.result), version=file_version(job.file_info))
+                # Commit where the line starts first, so recover() can tell a torn append from a finished one
+                queue.begin_write(file_id, os.fstat(writefile.fileno()).st_size)
+                writefile.write(job.result + "\n")
+                writefile.flush()
+                os.fsync(writefile.fileno())
+                stats['written'] += 1
+                print("Success!")
+            if outcome == DUPLICATE and not document_index.is_duplicate(file_id):
+                # Its original failed after it was matched, so it has to be extracted itself
+                outcome = FAILED
+            elif outcome == FAILED:
+                for orphan in document_index.discard(file_id):
+                    if manifest.get(orphan) is not None:
+                        manifest.record(manifest.get(orphan), FAILED)
+            queue.written(file_id, outcome)
+            manifest.record(job.file_info, outcome)
+            metrics.record(file_id, 'write', time.perf_counter() - start, outcome=outcome)
+
+        source = list_stage(drive_service, folder_links, manifest, stats, queue)
+        if resume:
+            if queue.get_meta('crawl_complete'):
+                source = resume_stage(queue, stats)
+            else:
+                source = chain(resume_stage(queue, stats), source)
+        print("Looking for files in folders...")
+        run_pipeline(source, stages, write_stage, on_stage=record_stage)
+    print(f"Processed {stats['queued']} files ({stats['resumed']} resumed, {stats['written']} written), skipped {stats['skipped']} already in the manifest and {stats['filtered']} by name or type")
+    print(f"Filename rule hits: {hit_counts()}")
+    print(f"Document clusters: {document_index.cluster_stats()}")
+    get_cleanup_batcher().close()
+    print(f"Cleanup batches: {cleanup_batcher.stats()}")
+    print(f"Gemini response cache: {response_cache.stats()}")
+    print(f"Gemini keys: {gemini_pool.stats()}")
+    response_cache.close()
+    queue.close()
+    metrics.write_prometheus()
+    metrics.close()
+    print(metrics.summary())
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract questions from the Science Olympiad test folders into beta_bank.json.")
+    parser.add_argument('--resume', action='store_true', help="Continue an interrupted run from each file's last completed stage")
+    args = parser.parse_args()
+
+    # --- Initialize APIs ---
+    drive_service = build('drive', 'v3', credentials=Credentials.from_authorized_user_file('token.json', ['https://www.googleapis.com/auth/drive.readonly','https://www.googleapis.com/auth/drive','https://www.googleapis.com/auth/drive.appfolder', 'https://www.googleapis.com/auth/drive.file']))
+    drive_service = authenticate_google_drive()
+
+    # --- Stream files through the pipeline ---
+    run(drive_service, folder_links, resume=args.resume)
@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+
+# Outcomes recorded for each processed Drive file
+EXTRACTED = 'extracted'
+FILTERED = 'filtered'
+FAILED = 'failed'
+TOO_SHORT = 'too_short'
+DUPLICATE = 'duplicate'
+OUTCOMES = (EXTRACTED, FILTERED, FAILED, TOO_SHORT, DUPLICATE)
+
+
+def file_version(file_info):
+    """Returns the identity of a file's current contents: its md5Checksum, or modifiedTime for Google Docs."""
+    return file_info.get('md5Checksum') or file_info.get('modifiedTime')
+
+
+class Manifest:
+    """
+    On-disk record of every Drive file main.py has already processed.
+
+    Entries are appended as JSON lines (last line per id wins), so a crash never
+    corrupts earlier records and lookups are a dict hit once the file is loaded.
+    """
+
+    def __init__(self, path='manifest.jsonl'):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from an interrupted run
+                        continue
+                    self.entries[entry['id']] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, file_id):
+        return file_id in self.entries
+
+    def get(self, file_id):
+        return self.entries.get(file_id)
+
+    def is_current(self, file_info, retry_failed=True):
+        """
+        Checks whether a file was already processed and has not changed since.
+
+        Args:
+            file_info (dict): Drive metadata with at least 'id' and 'md5Checksum' or 'modifiedTime'.
+            retry_failed (bool): Treat files whose last run failed as not yet processed.
+
+        Returns:
+            bool: True if the file can be skipped.
+        """
+        entry = self.entries.get(file_info['id'])
+        if entry is None:
+            return False
+        if retry_failed and entry['outcome'] == FAILED:
+            return False
+        version = file_version(file_info)
+        return version is not None and entry.get('version') == version
+
+    def record(self, file_info, outcome, **extra):
+        """Records the outcome of processing a file and appends it to the manifest file."""
+        if outcome not in OUTCOMES:
+            raise ValueError(f"Unknown outcome: {outcome}")
+        entry = {
+            'id': file_info['id'],
+            'name': file_info.get('name'),
+            'version': file_version(file_info),
+            'modifiedTime': file_info.get('modifiedTime'),
+            'md5Checksum': file_info.get('md5Checksum'),
+            'outcome': outcome,
+            'recorded': time.time(),
+            **extra,
+        }
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self.entries[entry['id']] = entry
+            with open(self.path, 'a') as f:
+                f.write(line)
+
+    def compact(self):
+        """Rewrites the manifest with only the latest entry per file."""
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
+
+    def counts(self):
+        """Returns the number of files per outcome."""
+        counts = {outcome: 0 for outcome in OUTCOMES}
+        for entry in self.entries.values():
+            counts[entry['outcome']] += 1
+        return counts
@@ -0,0 +1,114 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+_usage_lock = threading.Lock()
+
+# Per-file fields summed into Prometheus counters
+COUNTED_FIELDS = ('bytes', 'chars', 'prompt_chars', 'response_chars', 'retries', 'cache_hits', 'questions',
+                  'salvaged_responses', 'salvaged_questions', 'dropped_objects')
+
+
+def add_usage(usage, **counts):
+    """Adds counts into a per-job usage dict; safe to call from several threads at once."""
+    if usage is None:
+        return
+    with _usage_lock:
+        for name, value in counts.items():
+            usage[name] = usage.get(name, 0) + value
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (q in [0, 1])."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Metrics:
+    """
+    Structured per-file, per-stage instrumentation for an ingestion run.
+
+    Every record() call appends one JSON event (file, stage, wall time and whatever sizes
+    or counts the stage reported) to events_path. At the end of the run write_prometheus()
+    exports totals and stage latency quantiles in Prometheus text format, and summary()
+    renders throughput and p50/p95 latencies for the console.
+    """
+
+    def __init__(self, events_path='ingest_events.jsonl', prom_path='ingest_metrics.prom'):
+        self.events_path = events_path
+        self.prom_path = prom_path
+        self.started = time.time()
+        self.stage_seconds = defaultdict(list)
+        self.totals = Counter()
+        self.outcomes = Counter()
+        self._lock = threading.Lock()
+        self._events = open(events_path, 'a') if events_path else None
+
+    def record(self, file_id, stage, seconds, outcome=None, **fields):
+        event = {'time': round(time.time(), 3), 'file': file_id, 'stage': stage, 'seconds': round(seconds, 4)}
+        if outcome is not None:
+            event['outcome'] = outcome
+        event.update(fields)
+        with self._lock:
+            self.stage_seconds[stage].append(seconds)
+            for name in COUNTED_FIELDS:
+                if isinstance(fields.get(name), (int, float)):
+                    self.totals[name] += fields[name]
+            if stage == 'write' and outcome is not None:
+                self.outcomes[outcome] += 1
+            if self._events is not None:
+                self._events.write(json.dumps(event) + "\n")
+                self._events.flush()
+
+    def write_prometheus(self):
+        """Writes the run's metrics to prom_path (atomically, for node_exporter's textfile collector)."""
+        lines = [
+            "# HELP ingest_stage_seconds Wall time spent on one file in each pipeline stage.",
+            "# TYPE ingest_stage_seconds summary",
+        ]
+        with self._lock:
+            for stage, values in self.stage_seconds.items():
+                for q in (0.5, 0.95, 0.99):
+                    lines.append(f'ingest_stage_seconds{{stage="{stage}",quantile="{q}"}} {percentile(values, q):.6f}')
+                lines.append(f'ingest_stage_seconds_sum{{stage="{stage}"}} {sum(values):.6f}')
+                lines.append(f'ingest_stage_seconds_count{{stage="{stage}"}} {len(values)}')
+            lines.append("# HELP ingest_files_total Files that left the pipeline, by outcome.")
+            lines.append("# TYPE ingest_files_total counter")
+            for outcome, count in sorted(self.outcomes.items()):
+                lines.append(f'ingest_files_total{{outcome="{outcome}"}} {count}')
+            for name in COUNTED_FIELDS:
+                lines.append(f"# TYPE ingest_{name}_total counter")
+                lines.append(f"ingest_{name}_total {self.totals[name]}")
+            lines.append("# TYPE ingest_run_seconds gauge")
+            lines.append(f"ingest_run_seconds {time.time() - self.started:.3f}")
+        tmp_path = self.prom_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prom_path)
+
+    def summary(self):
+        """Returns a human-readable summary of throughput and stage latencies."""
+        with self._lock:
+            elapsed = time.time() - self.started
+            files = sum(self.outcomes.values())
+            lines = [
+                f"{files} files in {elapsed:.1f}s ({files / elapsed * 60 if elapsed else 0:.1f} files/min)",
+                f"Outcomes: {dict(self.outcomes)}",
+                f"Totals: {dict(self.totals)}",
+                f"{'stage':<12}{'count':>7}{'p50 s':>10}{'p95 s':>10}{'total s':>11}",
+            ]
+            for stage, values in self.stage_seconds.items():
+                lines.append(f"{stage:<12}{len(values):>7}{percentile(values, 0.5):>10.2f}{percentile(values, 0.95):>10.2f}{sum(values):>11.1f}")
+        return "\n".join(lines)
+
+    def close(self):
+        with self._lock:
+            if self._events is not None:
+                self._events.close()
+                self._events = None
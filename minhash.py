@@ -0,0 +1,127 @@
+import hashlib
+import re
+
+_MAX = (1 << 64) - 1
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(text):
+    """Lower-cases text and folds punctuation and whitespace runs into single spaces."""
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def shingles(text, k=5):
+    """Returns the set of k-word shingles of already normalized text (the whole text if shorter)."""
+    words = text.split()
+    if len(words) <= k:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def hash64(value):
+    """Stable 64-bit hash (Python's hash() is salted per process, so it can't be persisted)."""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def signature(features, num_perm=128):
+    """
+    Computes a MinHash signature of a set of strings with one-permutation hashing.
+
+    Each feature is hashed once; the hash picks one of num_perm bins and the bin keeps the
+    smallest value it sees. Empty bins borrow from the next non-empty bin (rotation
+    densification), so the cost is linear in the number of features rather than
+    num_perm times it, and two signatures still agree position by position with
+    probability equal to the sets' Jaccard similarity.
+
+    Returns:
+        list: num_perm integers, or an empty list for an empty set.
+    """
+    bins = [_MAX] * num_perm
+    for feature in features:
+        h = hash64(feature)
+        b = h % num_perm
+        v = h // num_perm
+        if v < bins[b]:
+            bins[b] = v
+    filled = [i for i, v in enumerate(bins) if v != _MAX]
+    if not filled:
+        return []
+    if len(filled) < num_perm:
+        offset = _MAX // num_perm + 1
+        next_filled = filled[0] + num_perm
+        for i in range(num_perm - 1, -1, -1):
+            if bins[i] != _MAX:
+                next_filled = i
+            else:
+                distance = next_filled - i
+                bins[i] = bins[next_filled % num_perm] + distance * offset
+    return bins
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    if not a or not b:
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class LSHIndex:
+    """
+    Locality-sensitive hashing over MinHash signatures.
+
+    Signatures are cut into `bands` bands; items sharing any whole band become candidates,
+    so a lookup touches only a handful of buckets instead of every stored item. With r
+    rows per band, pairs above roughly (1/bands) ** (1/r) similarity are likely to collide.
+    """
+
+    def __init__(self, num_perm=128, bands=32):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = {}
+        self.signatures = {}
+
+    def _band_keys(self, sig):
+        for band in range(self.bands):
+            start = band * self.rows
+            yield (band, *sig[start:start + self.rows])
+
+    def add(self, key, sig):
+        if not sig:
+            return
+        self.signatures[key] = sig
+        for band_key in self._band_keys(sig):
+            self.buckets.setdefault(band_key, []).append(key)
+
+    def remove(self, key):
+        """Drops a stored item, if there is one."""
+        sig = self.signatures.pop(key, None)
+        if sig is None:
+            return
+        for band_key in self._band_keys(sig):
+            bucket = self.buckets[band_key]
+            bucket.remove(key)
+            if not bucket:
+                del self.buckets[band_key]
+
+    def candidates(self, sig):
+        found = set()
+        if not sig:
+            return found
+        for band_key in self._band_keys(sig):
+            found.update(self.buckets.get(band_key, ()))
+        return found
+
+    def query(self, sig, threshold):
+        """Returns (key, similarity) of the closest stored item at or above threshold, or None."""
+        best = None
+        for key in self.candidates(sig):
+            score = similarity(sig, self.signatures[key])
+            if score >= threshold and (best is None or score > best[1]):
+                best = (key, score)
+        return best
+
+    def __len__(self):
+        return len(self.signatures)
@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+_DONE = object()
+
+
+class Job:
+    """A single file moving through the pipeline. Stages fill in fields as they go."""
+
+    def __init__(self, file_info, idx=0):
+        self.file_info = file_info
+        self.idx = idx
+        self.payload = None
+        self.text = None
+        self.text_key = None
+        self.raw_output = None
+        self.result = None
+        self.outcome = None
+        self.error = None
+        # Sizes and counts the current stage reports, see metrics.py
+        self.metrics = {}
+
+    @property
+    def finished(self):
+        """A job is finished early once a stage sets its outcome or it fails."""
+        return self.outcome is not None or self.error is not None
+
+
+class Stage:
+    """
+    One step of the pipeline.
+
+    Args:
+        name (str): Stage name used in log output.
+        fn (callable): Takes a Job and returns it (updated). Setting job.outcome sends the
+            job straight to the sink, skipping the remaining stages.
+        workers (int): Maximum number of jobs this stage handles at once.
+        processes (bool): Run fn in a process pool (for CPU-bound work) instead of threads.
+            fn must then be a picklable top-level function.
+        queue_size (int): Capacity of the queue feeding this stage.
+        skip (callable): Optional predicate; jobs it returns True for pass through this
+            stage untouched, without being sent to a worker process.
+    """
+
+    def __init__(self, name, fn, workers=1, processes=False, queue_size=None, skip=None):
+        self.name = name
+        self.fn = fn
+        self.skip = skip
+        self.workers = workers
+        self.processes = processes
+        self.queue_size = queue_size if queue_size is not None else workers * 2
+
+
+def run_pipeline(source, stages, sink, mp_context='spawn', on_stage=None):
+    """
+    Streams jobs from source through each stage and hands every job to sink once it is done.
+
+    Each stage has its own worker threads and a bounded input queue, so a slow stage only
+    backs up the stages feeding it rather than stalling unrelated work, and the source is
+    only consumed as fast as the first stage can take jobs. Process stages use their threads
+    purely as dispatchers into a ProcessPoolExecutor of the same size.
+
+    sink is called from the calling thread, one job at a time, as soon as each job completes
+    or finishes early, so it can write results without locking.
+
+    Args:
+        source (iterable): Yields Job objects.
+        stages (list): Stage objects, in order.
+        sink (callable): Called with each finished Job.
+        mp_context (str): multiprocessing start method for process stages.
+        on_stage (callable): Optional on_stage(stage_name, job, seconds), called from the
+            worker thread after each stage runs on a job (skipped stages excluded).
+    """
+    queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+    sink_queue = queue.Queue()
+    executors = []
+    threads = []
+
+    def feed():
+        try:
+            for job in source:
+                queues[0].put(job)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            for _ in range(stages[0].workers):
+                queues[0].put(_DONE)
+
+    def make_worker(i, stage, executor, remaining, lock):
+        in_queue = queues[i]
+        is_last = i == len(stages) - 1
+
+        def work():
+            try:
+                while True:
+                    job = in_queue.get()
+                    if job is _DONE:
+                        break
+                    try:
+                        if stage.skip is None or not stage.skip(job):
+                            start = time.perf_counter()
+                            try:
+                                if executor is not None:
+                                    job = executor.submit(stage.fn, job).result()
+                                else:
+                                    job = stage.fn(job)
+                            except Exception as e:
+                                print(f"[{stage.name}] Error processing {job.file_info.get('name')}: {e}")
+                                job.error = e
+                            if on_stage is not None:
+                                on_stage(stage.name, job, time.perf_counter() - start)
+                    except Exception as e:
+                        # A failing skip() or on_stage() fails the job, not the worker
+                        print(f"[{stage.name}] Error handling {job.file_info.get('name')}: {e}")
+                        job.error = e
+                    if job.finished or is_last:
+                        sink_queue.put(job)
+                    else:
+                        queues[i + 1].put(job)
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    last_worker = remaining[0] == 0
+                # The last worker out closes the next stage, after every job it produced
+                if last_worker:
+                    if is_last:
+                        sink_queue.put(_DONE)
+                    else:
+                        for _ in range(stages[i + 1].workers):
+                            queues[i + 1].put(_DONE)
+
+        return work
+
+    try:
+        for i, stage in enumerate(stages):
+            executor = None
+            if stage.processes:
+                executor = ProcessPoolExecutor(max_workers=stage.workers, mp_context=multiprocessing.get_context(mp_context))
+                executors.append(executor)
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=make_worker(i, stage, executor, remaining, lock), name=f"{stage.name}-worker", daemon=True)
+                thread.start()
+                threads.append(thread)
+        feeder = threading.Thread(target=feed, name="source", daemon=True)
+        feeder.start()
+        threads.append(feeder)
+
+        while True:
+            job = sink_queue.get()
+            if job is _DONE:
+                break
+            sink(job)
+        for thread in threads:
+            thread.join()
+    finally:
+        for executor in executors:
+            executor.shutdown(cancel_futures=True)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import re
+from collections import Counter
+from functools import partial
+from minhash import LSHIndex, hash64, normalize_text, shingles, signature
+
+# "1.", "12)", "Q3:" or "Question 4." numbering at the start of a question
+_NUMBERING = re.compile(r"^\s*(?:(?:question|q)\s*)?\d{1,3}\s*[.):]\s*", re.IGNORECASE)
+
+
+def question_text(q):
+    """The question's normalized text, without any numbering it was copied with."""
+    return normalize_text(_NUMBERING.sub('', str(q.get('question', ''))))
+
+
+def question_options(q):
+    """The question's normalized options, sorted so their order doesn't matter."""
+    options = q.get('options')
+    if not isinstance(options, list):
+        return []
+    return sorted(normalize_text(str(option)) for option in options)
+
+
+def question_fingerprint(q, num_perm=64, shingle_size=3, with_signature=True):
+    """
+    Everything QuestionClusters.add() needs to know about a question's text, computed up
+    front so it can be done in another process.
+
+    Returns:
+        tuple: (16-byte digest of the normalized text and sorted options, the hashed
+        shingle and option features, MinHash signature). Without with_signature only the
+        digest is computed, for add() to compute the rest only if needed.
+    """
+    text = question_text(q)
+    options = question_options(q)
+    digest = hashlib.blake2b(json.dumps([text, options]).encode('utf-8'), digest_size=16).digest()
+    if not with_signature:
+        return digest, None, None
+    features = shingles(text, shingle_size) | {'option:' + option for option in options}
+    return digest, frozenset(hash64(feature) for feature in features), signature(features, num_perm)
+
+
+def jaccard(a, b):
+    """Exact Jaccard similarity of two feature sets."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def canonical_rank(q):
+    """Which copy of a question to keep: the one with the most options, then one with integer answers."""
+    options = q.get('options')
+    answers = q.get('answers')
+    integer_answers = isinstance(answers, list) and len(answers) > 0 and all(isinstance(a, int) for a in answers)
+    return (len(options) if isinstance(options, list) else 0, integer_answers)
+
+
+class QuestionClusters:
+    """
+    Near-duplicate detection for extracted questions.
+
+    Questions that are equal once whitespace, punctuation, case, leading numbering and
+    option order are folded away are clustered by a dictionary lookup. Everything else is
+    cut into word shingles (plus one feature per option) and reduced to a MinHash
+    signature. The LSH index only proposes clusters: a question joins the cluster whose
+    first member's features it shares at least threshold of (exact Jaccard), since the
+    signature estimate is too coarse for short questions that differ in one word. Only
+    each cluster's first member is indexed, so a question costs one signature and one
+    LSH lookup and a build stays linear in the number of questions. Exact matches are
+    looked up by a fixed-size digest, so memory grows with the number of distinct
+    questions but not their length.
+
+    Every cluster keeps the copy canonical_rank() prefers, the earliest one on ties.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, shingle_size=3, across_events=True):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.across_events = across_events
+        self._lsh = {}
+        # Per scope: question digest -> cluster
+        self._exact = {}
+        # Per cluster: its first member's hashed features
+        self._features = {}
+        # Per question: its cluster (the id of the cluster's first member)
+        self._cluster = []
+        # Per cluster: (rank, -id) of its canonical copy, member count, events and a preview
+        self._best = {}
+        self._size = Counter()
+        self._events = {}
+        self._preview = {}
+
+    def _scope(self, event):
+        return None if self.across_events else event
+
+    def settings(self):
+        """The settings that decide how questions are clustered."""
+        return {
+            'threshold': self.threshold, 'num_perm': self.num_perm, 'bands': self.bands,
+            'shingle_size': self.shingle_size, 'across_events': self.across_events,
+            'verify': 'jaccard',
+        }
+
+    def fingerprinter(self, with_signature=True):
+        """Returns a picklable function computing the fingerprints add() accepts."""
+        return partial(question_fingerprint, num_perm=self.num_perm, shingle_size=self.shingle_size, with_signature=with_signature)
+
+    def add(self, event, q, fingerprint=None):
+        """
+        Clusters a question with the ones added before it.
+
+        Args:
+            event (str): The question's event.
+            q (dict): The question.
+            fingerprint (tuple): The question's fingerprint from fingerprinter(), if already computed.
+
+        Returns:
+            int: The question's id, to pass to is_canonical() once every question is added.
+        """
+        question_id = len(self._cluster)
+        scope = self._scope(event)
+        digest, features, sig = fingerprint if fingerprint is not None else question_fingerprint(q, with_signature=False)
+        exact = self._exact.get(scope)
+        if exact is None:
+            exact = self._exact[scope] = {}
+        cluster = exact.get(digest)
+        if cluster is None:
+            if sig is None:
+                _, features, sig = question_fingerprint(q, self.num_perm, self.shingle_size)
+            lsh = self._lsh.get(scope)
+            if lsh is None:
+                lsh = self._lsh[scope] = LSHIndex(self.num_perm, self.bands)
+            best = None
+            for candidate in sorted(lsh.candidates(sig)):
+                score = jaccard(features, self._features[candidate])
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (candidate, score)
+            if best is not None:
+                cluster = best[0]
+            else:
+                cluster = question_id
+                lsh.add(question_id, sig)
+                self._features[question_id] = features
+            exact[digest] = cluster
+        self._cluster.append(cluster)
+
+        rank = (canonical_rank(q), -question_id)
+        if cluster not in self._best or rank > self._best[cluster]:
+            self._best[cluster] = rank
+            self._preview[cluster] = str(q.get('question', ''))[:120]
+        self._size[cluster] += 1
+        self._events.setdefault(cluster, set()).add(event)
+        return question_id
+
+    def is_canonical(self, question_id):
+        """True if the question is the copy its cluster keeps."""
+        return -self._best[self._cluster[question_id]][1] == question_id
+
+    def report(self, largest=20):
+        """Returns question, cluster and duplicate counts, the cluster size distribution and the largest clusters."""
+        clusters = [cluster for cluster, size in self._size.items() if size > 1]
+        clusters.sort(key=lambda cluster: (-self._size[cluster], cluster))
+        return {
+            'questions': len(self._cluster),
+            'clusters': len(clusters),
+            'duplicates': len(self._cluster) - len(self._size),
+            'cross_event_clusters': sum(1 for cluster in clusters if len(self._events[cluster]) > 1),
+            'cluster_sizes': dict(sorted(Counter(self._size[cluster] for cluster in clusters).items())),
+            'largest': [
+                {'size': self._size[cluster], 'events': sorted(self._events[cluster]), 'question': self._preview[cluster]}
+                for cluster in clusters[:largest]
+            ],
+        }
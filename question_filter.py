@@ -0,0 +1,256 @@
+import json
+import regex as re
+from collections import Counter, defaultdict, deque
+
+# Phrases that mark a question as depending on a figure, a station, another question or
+# the test's own logistics. Kept exactly as toDB.py has always used them: the missing comma
+# after " u?" glues it to "this picture", and "Identify #" can never match lower-cased text.
+PHRASES = [
+    " a?", " b?", " c?", " d?", " g?", " h?", " i?", " j?", " k?", " l?", " m?", " n?", " o?", " p?", " q?", " r?", " s?", " t?", " u?"
+    "this picture", "this image", "this diagram", "this map",
+    "in figure", "pictured below",
+    "this specimen", "this organism", "the photo below",
+    "given information", "the table", "the structures labeled",
+    "specimen 1", "specimen 2", "specimen 3", "specimen 4", "specimen 5",
+    "specimen 6", "specimen 7", "specimen 8", "specimen 9", "specimen 10",
+    "this individual", "Identify #", "diagram below", "the diagram",
+    "slide above", "picture below", "the picture", "shown above", "shown below", "question #",
+    "indicated by", "diagram to the right", "this device", "these specimens", "multiple choice",
+    "shown to the right", "(left)", "(right)", "graph above",
+    "the reading on", "the image",
+    "labeled by", "which image", "above image", "below image", "in the image",
+    "depicted", "the figure", "above?", "to the right", "the chart",
+    "the diagram", "red arrow", "black arrow", "the arrow",
+    "labelled", "for the given", "if this", "above equation",
+    "original test", "fossil above", "question (", "depicted", "projection 1", "projection 2",
+    "projection 3", "the map?", "circular symbol", "union hill", "locations 1", "location 1",
+    "at the right?", "on the map", "interpret the", "evidence a", "evidence b",
+    "evidence c", "which suspect", "what is the id ", "are you currently in a location where you cannot see or talk to your partner?",
+    "honor code", "from the provided answer key", "according to article", "previous question",
+    "found at the scene", "according to elsa's bio", "from the scenario", "on my honor",
+    "following questions refer to light and electron microscopes", "given the following graph",
+    "shown on the graph", "suspect no.", "from the given scenario", "the competitors",
+    "information needed",
+]
+
+BAD_PREFIXES = ("which letter", "based on your", "based on the", "based on this", "these are", "calculate the", "participants")
+
+NON_ANSWERS = frozenset(["free response", "requires missing", "unknown", "refer to"])
+
+# Rejections that happen before the question rules run, recorded by toDB.py
+UNKNOWN_KEY = 'unknown_key'
+IGNORED_EVENT = 'ignored_event'
+NOT_A_LIST = 'not_a_list'
+SINGLE_QUESTION = 'single_question'
+
+QUESTION_NUMBER = re.compile(r"(q|Q)uestion [0-9]+[^:]")
+# Labels like "Figure B." or "specimen 12," that point at something not in the question:
+# one of LABEL_WORDS, a space, capitals or digits, then whitespace or punctuation.
+LABEL_WORDS = (
+    r"(((i|I)mages*)|(e|E)vents*)|((f|F)eatures*)|(row)|((p|P)owder)|(patient)|((l|L)abels*)|(labeled)|(horomone)|(items*)|(ganglion)|(disorders*)|((r|R)egion)|(when)|((N|n)euron)|(Box)|((s|S)pecimens*)|((m|M)odels*)|((l|L)ayers*)|(part of)|((s|S)olids*)|((f|F)igure)|((m|M)etals*)|((h|H)airs*)|((f|F)ibers*)|((p|P)lastics*)|((f|F)ingerprints*)|((s|S)oils*)|((s|S)tructures*)|((p|P)oint)|((u|U)nit)|((p|P)anel)|((f|F)eatures*)|((l|L)iquid)|((f|F)igures*)|((s|S)pecimens*)|((p|P)oints*)|((l|L)etters*)|((f|F)ibers*)|((s|S)ymbol)"
+)
+LABEL_TAIL = re.compile(r" (?:[A-Z]+|[0-9]+)[\s.,?!;:]")
+# Matched backwards, so match(text, 0, end) checks for a label word ending exactly at end,
+# just like the lookbehind toDB.py used to run at every position of every question
+LABEL_WORD_BEFORE = re.compile(r"(?r)(?:" + LABEL_WORDS + r")")
+# Every label starts with a space followed by a capital letter or a digit
+LABEL_HINT = re.compile(r" [A-Z0-9]")
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton that finds whether any of a set of phrases occurs in a text.
+
+    The trie's failure links are folded into a full transition table up front, so a scan
+    is a single dict lookup per character no matter how many phrases there are.
+    """
+
+    def __init__(self, phrases):
+        self.phrases = list(phrases)
+        goto = [{}]
+        output = [None]
+        for phrase in self.phrases:
+            state = 0
+            for char in phrase:
+                if char not in goto[state]:
+                    goto.append({})
+                    output.append(None)
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            if output[state] is None:
+                output[state] = phrase
+
+        fail = [0] * len(goto)
+        self.delta = [None] * len(goto)
+        self.delta[0] = dict(goto[0])
+        pending = deque(goto[0].values())
+        while pending:
+            state = pending.popleft()
+            # Inherit every transition of the failure state, then override with the trie's own
+            transitions = dict(self.delta[fail[state]])
+            transitions.update(goto[state])
+            self.delta[state] = transitions
+            if output[state] is None:
+                output[state] = output[fail[state]]
+            for char, child in goto[state].items():
+                fail[child] = self.delta[fail[state]].get(char, 0)
+                pending.append(child)
+        self.output = output
+
+    def search(self, text):
+        """Returns the first phrase found in text (the one that ends earliest), or None."""
+        delta = self.delta
+        output = self.output
+        state = 0
+        for char in text:
+            state = delta[state].get(char, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+
+_phrases = PhraseMatcher(PHRASES)
+
+
+def has_label_reference(question):
+    """Checks for a label reference by testing only the few places one could start."""
+    for hint in LABEL_HINT.finditer(question):
+        start = hint.start()
+        if LABEL_TAIL.match(question, start) and LABEL_WORD_BEFORE.match(question, 0, start):
+            return True
+    return False
+
+
+def _blank_answer(first):
+    return first == "" or isinstance(first, list) and (first == [""] or first == [[]] or first == [[""]])
+
+
+def reject_reason(item):
+    """
+    Runs one extracted question through toDB.py's filter rules.
+
+    Rules run cheapest first and stop at the first one the question fails: structural
+    checks, then answer and length checks, then substring checks on the lower-cased text
+    (computed once), then one Aho-Corasick pass over every phrase, and the two regexes
+    last, each run only where a cheap test says it could match.
+
+    Returns:
+        str: The id of the first rule the question fails, or None if it is kept.
+    """
+    answers = item.get('answers')
+    if not (answers and isinstance(answers, list) and len(answers) > 0):
+        return 'no_answers'
+    question = item.get("question")
+    if not question:
+        return 'no_question'
+    if 'options' in item and len(item['options']) == 1:
+        return 'single_option'
+    first = answers[0]
+    if _blank_answer(first):
+        return 'blank_answer'
+    if len(question) <= 8:
+        return 'too_short'
+    if question == first:
+        return 'answer_is_question'
+    if isinstance(first, str):
+        if "answer" in first or "depends" in first:
+            return 'answer_mentions_answer'
+        first_lower = first.lower()
+        if "see answer" in first_lower:
+            return 'see_answer'
+        if first_lower in NON_ANSWERS:
+            return 'non_answer'
+    if sum(1 for s in answers if isinstance(s, str) and len(s) == 1) > 2:
+        return 'letter_answers'
+    options = item.get('options')
+    if options is not None and any(s == "A" for s in options) and "climate" not in question and "vitamin" not in question:
+        return 'letter_options'
+    length = len(question)
+    if length < 85 and " this " in question:
+        return 'short_this'
+    if length < 60 and "this object" in question:
+        return 'short_this_object'
+    if length < 40 and "is this?" in question:
+        return 'short_is_this'
+    if "provided" in question and ("based on" in question or "information" in question):
+        return 'provided_information'
+    lowered = question.lower()
+    if lowered.startswith(BAD_PREFIXES):
+        return 'bad_prefix'
+    if "station" in lowered and not lowered.startswith("station"):
+        return 'station'
+    if _phrases.search(lowered) is not None:
+        return 'phrase'
+    if "uestion " in question and QUESTION_NUMBER.search(question):
+        return 'question_number'
+    if has_label_reference(question):
+        return 'label_reference'
+    return None
+
+
+def accepts(item):
+    """True if an extracted question passes every filter rule."""
+    return reject_reason(item) is None
+
+
+class RejectionLog:
+    """
+    Accounting for questions the build drops: counts per rule and per event, plus a
+    compact JSON-lines sidecar with every rejected question and the first rule it failed.
+    """
+
+    def __init__(self, path='rejected.jsonl'):
+        self.path = path
+        self.by_rule = Counter()
+        self.by_event = defaultdict(Counter)
+        self._file = open(path, 'w') if path else None
+
+    def add(self, event, rule, item):
+        self.by_rule[rule] += 1
+        self.by_event[event][rule] += 1
+        if self._file is not None:
+            self._file.write(json.dumps({'event': event, 'rule': rule, 'item': item}, separators=(',', ':')) + "\n")
+
+    def add_all(self, event, rule, items):
+        """Records a whole list of questions dropped for the same reason."""
+        for item in items:
+            self.add(event, rule, item)
+
+    def checkpoint(self):
+        """Returns what resume() needs to carry on from this point."""
+        if self._file is not None:
+            self._file.flush()
+        return {
+            'size': self._file.tell() if self._file is not None else 0,
+            'by_rule': dict(self.by_rule),
+            'by_event': {event: dict(counts) for event, counts in self.by_event.items()},
+        }
+
+    @classmethod
+    def resume(cls, path, checkpoint):
+        """Reopens a log where checkpoint() left it, dropping anything written after that."""
+        log = cls(None)
+        log.path = path
+        with open(path, 'r+b') as f:
+            f.truncate(checkpoint['size'])
+        log._file = open(path, 'a')
+        log.by_rule.update(checkpoint['by_rule'])
+        for event, counts in checkpoint['by_event'].items():
+            log.by_event[event].update(counts)
+        return log
+
+    def total(self):
+        return sum(self.by_rule.values())
+
+    def report(self):
+        """Returns rejection counts by rule and by event, most frequent first."""
+        return {
+            'total': self.total(),
+            'rules': dict(self.by_rule.most_common()),
+            'events': {event: dict(counts.most_common()) for event, counts in self.by_event.items()},
+        }
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,99 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of LLM responses.
+
+    Entries are keyed by a hash of the model name, the prompt template version and the
+    prompt inputs, so an unchanged input never reaches the API twice while any change to
+    the prompt or model misses. The cache is a single SQLite file; once its contents grow
+    past max_bytes the least recently used entries are evicted.
+    """
+
+    def __init__(self, path='gemini_cache.sqlite', max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(model, prompt_version, *inputs):
+        """Hashes everything that determines a response into a cache key."""
+        digest = hashlib.sha256()
+        for part in (model, str(prompt_version), *inputs):
+            data = part.encode('utf-8')
+            # Length-prefix each part so ("ab", "c") and ("a", "bc") hash differently
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns the cached response for key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, value):
+        """Stores a response, evicting least recently used entries to stay under max_bytes."""
+        size = len(value.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._total -= old[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._total += size
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        for key, size in rows:
+            if self._total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total -= size
+
+    def stats(self):
+        """Returns hit/miss counts for this session along with the cache's size."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': entries,
+                'bytes': self._total,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,156 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_DIR = 'text_cache'
+
+
+def _with_settings(key, settings):
+    if settings is None:
+        return key
+    return key + '-' + hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def text_cache_key(file_info, settings=None):
+    """
+    Returns the cache key for a Drive file's extracted text, or None if it can only be
+    keyed by its bytes.
+
+    Binary files use Drive's md5Checksum, which changes whenever the content does. Google
+    Docs have no checksum, so they are keyed by id and modifiedTime instead. settings (see
+    text_extract.extraction_settings()) are hashed into the key, so text extracted with
+    another backend, page splitting or extractor version is never reused.
+    """
+    if file_info.get('md5Checksum'):
+        return _with_settings(file_info['md5Checksum'], settings)
+    if file_info.get('modifiedTime'):
+        return _with_settings('doc-' + hashlib.sha256(f"{file_info['id']}@{file_info['modifiedTime']}".encode()).hexdigest(), settings)
+    return None
+
+
+def bytes_key(data, settings=None):
+    """Cache key for a document known only by its downloaded bytes."""
+    return _with_settings('sha-' + hashlib.sha256(data).hexdigest(), settings)
+
+
+class TextCache:
+    """
+    Gzip-compressed extracted document text on disk, one file per key.
+
+    Writes go through a temp file and os.replace, so concurrent workers (including ones in
+    other processes) never see a partially written entry. Reads refresh the file's mtime,
+    which prune() uses as the last-used time.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.txt.gz')
+
+    def get(self, key):
+        """Returns the cached text for key, or None."""
+        path = self.path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                text = f.read()
+        except (FileNotFoundError, OSError, EOFError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return text
+
+    def put(self, key, text):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                f.write(text.encode('utf-8'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def entries(self):
+        """Yields (path, size, mtime) for every cached entry."""
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.txt.gz'):
+                    path = os.path.join(root, name)
+                    st = os.stat(path)
+                    yield path, st.st_size, st.st_mtime
+
+    def stats(self):
+        count = 0
+        size = 0
+        for _, entry_size, _ in self.entries():
+            count += 1
+            size += entry_size
+        return {'entries': count, 'bytes': size}
+
+    def prune(self, max_bytes=None, older_than=None):
+        """
+        Deletes entries unused for more than older_than seconds, then the least recently
+        used ones until the cache fits in max_bytes.
+
+        Returns:
+            tuple: (entries removed, bytes freed)
+        """
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - older_than if older_than is not None else None
+        removed = 0
+        freed = 0
+        for path, size, mtime in entries:
+            expired = cutoff is not None and mtime < cutoff
+            too_big = max_bytes is not None and total > max_bytes
+            if not expired and not too_big:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
+
+
+def parse_size(value):
+    """Parses sizes like 500M or 2G into bytes."""
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    value = value.strip().lower().rstrip('b')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or prune the extracted text cache.")
+    parser.add_argument('--dir', default=DEFAULT_DIR, help="cache directory")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats', help="show the number and total size of cached documents")
+    prune = sub.add_parser('prune', help="delete old or least recently used entries")
+    prune.add_argument('--max-size', type=parse_size, help="shrink the cache to this size, e.g. 500M")
+    prune.add_argument('--older-than', type=float, help="remove entries unused for this many days")
+    args = parser.parse_args()
+
+    cache = TextCache(args.dir)
+    if args.command == 'stats':
+        stats = cache.stats()
+        print(f"{stats['entries']} documents, {stats['bytes'] / 1024 ** 2:.1f} MiB in {args.dir}")
+    else:
+        older_than = args.older_than * 86400 if args.older_than is not None else None
+        removed, freed = cache.prune(max_bytes=args.max_size, older_than=older_than)
+        print(f"Removed {removed} documents, freed {freed / 1024 ** 2:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
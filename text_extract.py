@@ -0,0 +1,174 @@
+import argparse
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+# Pages are joined with form feeds, the same separator pdfminer puts between pages,
+# so later stages can recover page boundaries with split_pages()
+PAGE_BREAK = '\f'
+BACKENDS = ('pymupdf', 'pdfminer')
+DEFAULT_BACKEND = 'pymupdf' if pymupdf is not None else 'pdfminer'
+# Pages per process-pool task; shorter documents are extracted in a single call
+PAGES_PER_TASK = 16
+# Bump whenever a change here or in main.py's converters changes the text they produce,
+# so text cached by the old code isn't reused
+EXTRACTOR_VERSION = 1
+
+
+def resolve_backend(backend):
+    """The backend extract_pdf_pages() tries first: pdfminer when PyMuPDF isn't installed."""
+    return 'pdfminer' if backend == 'pymupdf' and pymupdf is None else backend
+
+
+def extraction_settings(backend=DEFAULT_BACKEND, pages_per_task=PAGES_PER_TASK):
+    """Everything besides the document that decides the text extract_pdf_pages() returns, for cache keys."""
+    backend = resolve_backend(backend)
+    if backend == 'pymupdf':
+        library_version = pymupdf.__version__
+    else:
+        try:
+            import pdfminer
+            library_version = pdfminer.__version__
+        except ImportError:
+            library_version = None
+    return {
+        'extractor': EXTRACTOR_VERSION, 'backend': backend, 'library_version': library_version,
+        'pages_per_task': pages_per_task,
+    }
+
+
+def pages_to_text(pages):
+    return PAGE_BREAK.join(pages)
+
+
+def split_pages(text):
+    return text.split(PAGE_BREAK)
+
+
+def _read_source(source):
+    """Accepts bytes, a path or a binary file object and returns something both backends can open."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, str):
+        return source
+    source.seek(0)
+    return source.read()
+
+
+def count_pages(source, backend=DEFAULT_BACKEND):
+    source = _read_source(source)
+    if backend == 'pymupdf':
+        with _open_pymupdf(source) as doc:
+            return doc.page_count
+    from pdfminer.pdfpage import PDFPage
+    with _open_binary(source) as fp:
+        return sum(1 for _ in PDFPage.get_pages(fp))
+
+
+def _open_pymupdf(source):
+    if isinstance(source, str):
+        return pymupdf.open(source)
+    return pymupdf.open(stream=source, filetype='pdf')
+
+
+def _open_binary(source):
+    return open(source, 'rb') if isinstance(source, str) else io.BytesIO(source)
+
+
+def extract_page_range(source, start, stop, backend=DEFAULT_BACKEND):
+    """Returns the text of pages [start, stop) as a list, one string per page."""
+    source = _read_source(source)
+    if backend == 'pymupdf':
+        with _open_pymupdf(source) as doc:
+            return [doc[i].get_text() for i in range(start, min(stop, doc.page_count))]
+    if backend == 'pdfminer':
+        from pdfminer.high_level import extract_text
+        with _open_binary(source) as fp:
+            text = extract_text(fp, page_numbers=list(range(start, stop)))
+        # pdfminer ends every page with a form feed
+        pages = text.split('\f')
+        return pages[:-1] if pages and pages[-1] == '' else pages
+    raise ValueError(f"Unknown PDF backend: {backend}")
+
+
+def _extract_task(args):
+    return extract_page_range(*args)
+
+
+def extract_pdf_pages(source, backend=DEFAULT_BACKEND, workers=1, pages_per_task=PAGES_PER_TASK, mp_context='spawn'):
+    """
+    Extracts a PDF's text page by page, in order.
+
+    With workers > 1 and more than pages_per_task pages, the page ranges are extracted in
+    a process pool. If the chosen backend cannot read the document, pdfminer is tried
+    before giving up.
+
+    Args:
+        source: PDF bytes, a path, or a binary file object.
+        backend (str): 'pymupdf' (faster) or 'pdfminer'.
+        workers (int): Processes to spread page ranges over.
+        pages_per_task (int): Pages handed to each task.
+
+    Returns:
+        list: One string per page.
+    """
+    backend = resolve_backend(backend)
+    source = _read_source(source)
+    try:
+        page_count = count_pages(source, backend)
+        if workers <= 1 or page_count <= pages_per_task:
+            return extract_page_range(source, 0, page_count, backend)
+        tasks = [(source, start, min(start + pages_per_task, page_count), backend)
+                 for start in range(0, page_count, pages_per_task)]
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context(mp_context)) as executor:
+            pages = []
+            # map() yields results in submission order, so page order is preserved
+            for chunk in executor.map(_extract_task, tasks):
+                pages.extend(chunk)
+            return pages
+    except Exception as e:
+        if backend == 'pdfminer':
+            raise
+        print(f"{backend} could not read the PDF ({e}), falling back to pdfminer")
+        return extract_pdf_pages(source, 'pdfminer', workers, pages_per_task, mp_context)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract text from PDFs page by page and report throughput.")
+    parser.add_argument('files', nargs='+', help="PDF files to extract")
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_BACKEND)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="processes per document")
+    parser.add_argument('--pages-per-task', type=int, default=PAGES_PER_TASK)
+    parser.add_argument('--output', help="directory to write <name>.txt files to")
+    args = parser.parse_args()
+
+    total_pages = 0
+    total_time = 0.0
+    for path in args.files:
+        start = time.perf_counter()
+        pages = extract_pdf_pages(path, args.backend, args.workers, args.pages_per_task)
+        elapsed = time.perf_counter() - start
+        total_pages += len(pages)
+        total_time += elapsed
+        print(f"{path}: {len(pages)} pages in {elapsed:.2f}s ({len(pages) / elapsed if elapsed else 0:.1f} pages/sec)")
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            out_path = os.path.join(args.output, os.path.splitext(os.path.basename(path))[0] + '.txt')
+            with open(out_path, 'w', encoding='utf-8') as f:
+                f.write(pages_to_text(pages))
+    if total_time:
+        print(f"Total: {total_pages} pages in {total_time:.2f}s ({total_pages / total_time:.1f} pages/sec) with {args.backend}")
+
+
+if __name__ == '__main__':
+    main()
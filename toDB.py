@@ -1,6 +1,28 @@
+import argparse
+import hashlib
+import io
 import json
 import os
-import regex as re
+import pickle
+import shutil
+import sys
+import tempfile
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import event_resolver
+import minhash
+import question_dedup
+import question_filter
+from event_resolver import EventResolver, UNRESOLVED, load_events
+from extraction_store import ExtractionStore
+from question_dedup import QuestionClusters
+from question_filter import reject_reason, RejectionLog, UNKNOWN_KEY, IGNORED_EVENT, NOT_A_LIST, SINGLE_QUESTION
+
+# Parallel builds hand workers line-aligned ranges of about this many bytes
+RANGE_BYTES = 8 * 1024 * 1024
+# Where incremental builds keep their spill files and de-duplication state
+STATE_DIR = 'toDB_state'
+_resolver = None
 titles = {
     'geology': 'Geologic Mapping',
     'digestive': 'Anatomy - Digestive',
@@ -923,188 +945,791 @@ titles = {
     'anatomy - immune matching': 'Anatomy - Immune'
 }
 
-print("All values:", [*set([f for f in titles.values() if f is not None])])
-# os.exit()
-def combine_bank_data(filename="beta_bank.json"):
+
+
+def default_resolver():
+    """The resolver for the titles map and main.py's events, built on first use."""
+    global _resolver
+    if _resolver is None:
+        _resolver = EventResolver(titles, load_events())
+    return _resolver
+
+
+def parse_lines(lines):
+    """Yields the extraction on each bank line, skipping (and reporting) lines that aren't valid JSON."""
+    for line in lines:
+        try:
+            data = json.loads(line.strip())
+        except json.JSONDecodeError:
+            print(f"Skipping invalid JSON line: {line.strip()}")
+            continue
+        yield data
+
+
+def store_extractions(store_dir="extraction_store"):
+    """
+    Yields the extractions held in main.py's ExtractionStore, {event key: [questions]} per
+    stored record, with only the latest version of each source file. Records come in the
+    order they were written, which for a store filled alongside beta_bank.json (or with
+    extraction_store.py import) is bank order.
+    """
+    for record in ExtractionStore(store_dir).records(in_order=True):
+        yield {record['event']: record['questions']}
+
+
+def event_questions(extractions, rejections=None, unknown_keys=None, resolver=None):
+    """
+    Maps each extraction's event keys to events and runs their questions through the
+    filter rules, one extraction at a time.
+
+    Args:
+        extractions (iterable): Extractions as Gemini returns them, {event key: [questions]}.
+        rejections (RejectionLog): Records every dropped question and the first rule it failed.
+        unknown_keys (set): Collects keys that resolve to no event instead of printing them at the end.
+        resolver (EventResolver): Maps event keys to events (default: default_resolver()).
+
+    Yields:
+        tuple: (event, list of accepted questions) for every mapped event of every
+        extraction, in order. The list may be empty; the event still counts as seen.
+    """
+    if rejections is None:
+        rejections = RejectionLog(None)
+    if resolver is None:
+        resolver = default_resolver()
+    bruh = set() if unknown_keys is None else unknown_keys
+    for data in extractions:
+        for key, value in data.items():
+            key = key.lower()
+            items = value if isinstance(value, list) else [value]
+            raw_key = key
+            key, method = resolver.resolve(key)
+            if method == UNRESOLVED:
+                bruh.add(raw_key)
+                rejections.add_all(raw_key, UNKNOWN_KEY, items)
+                continue
+            if key is None:
+                rejections.add_all(raw_key, IGNORED_EVENT, items)
+                continue
+            if not isinstance(value,list) or len(value) == 1:
+                rejections.add_all(key, SINGLE_QUESTION if isinstance(value, list) else NOT_A_LIST, items)
+                yield key, []
+                continue
+            yield key, list(filter_questions(value, key, rejections))
+    if unknown_keys is None:
+        print("Unknown keys: ", bruh)
+
+
+def accepted_questions(lines, rejections=None, unknown_keys=None, resolver=None):
+    """event_questions() over the lines of a bank file, one JSON extraction per line."""
+    return event_questions(parse_lines(lines), rejections, unknown_keys, resolver)
+
+
+def filter_questions(questions, event=None, rejections=None):
+    """
+    Yields the questions that pass every filter rule.
+
+    Args:
+        questions (iterable): Question dicts.
+        event (str): The questions' event, for rejections.
+        rejections (RejectionLog): Records every dropped question and the first rule it failed.
+    """
+    for q in questions:
+        rule = reject_reason(q)
+        if rule is None:
+            yield q
+        elif rejections is not None:
+            rejections.add(event, rule, q)
+
+
+def combine_bank_data(filename="beta_bank.json", rejections=None):
     """
     Combines JSON objects from a file, extending arrays for same keys
     and filtering out objects with empty 'answers' arrays.
 
     Args:
         filename (str): The name of the file containing JSON objects.
+        rejections (RejectionLog): Records every dropped question and the first rule it failed.
 
     Returns:
-        dict: A single dictionary containing the combined JSON data.
+        list: The combined JSON data, and the rejection counts per event and rule.
     """
     combined_data = {}
-    excluded_data = {}
-    bruh = set()
+    if rejections is None:
+        rejections = RejectionLog(None)
     with open(filename, 'r') as f:
-        for line in f:
-            try:
-                data = json.loads(line.strip())
-                for key, value in data.items():
-                    key = key.lower()
-                    if key not in titles:
-                        bruh.add(key)
-                        continue
-                    key = titles[key]
-                    if key is None:
-                        continue
-                    if not key in combined_data:
-                        combined_data[key] = []
-                        excluded_data[key] = []
-                    if not isinstance(value,list) or len(value) == 1:
-                        continue
-                    # Extend the existing list with new items, filtering as needed
-
-                    combined_data[key].extend([
-                        item
-                        for item in value
-                        if item.get('answers') and isinstance(item['answers'],list) and len(item['answers']) > 0 and item.get("question") and ('options' not in item or len(item['options']) != 1)
-                        and not (item['answers'][0] == "" or isinstance(item['answers'][0],list) and (item['answers'][0] == [""] or item['answers'][0] == [[]] or item['answers'][0] == [[""]]))
-                        and len(item['question']) > 8
-                        and not (isinstance(item['answers'][0], str) and "see answer" in item['answers'][0].lower())
-                        and not ("based on" in item['question'] and "provided" in item['question'] or "information" in item['question'] and "provided" in item['question'])
-                        and not (len(item['question']) < 85 and " this " in item['question'])
-                        and not (len(item['question']) < 60 and "this object" in item['question'])
-                        and not (isinstance(item['answers'][0],str) and ("answer" in item['answers'][0] or "depends" in item['answers'][0]))
-                        and not ("is this?" in item['question'] and len(item['question']) < 40)
-                        and not (item['question'].lower().startswith("which letter"))
-                        and not (item['question'].lower().startswith("based on your"))
-                        and not (item['question'].lower().startswith("based on the"))
-                        and not (item['question'].lower().startswith("based on this"))
-                        and not (item['question'].lower().startswith("these are"))
-                        and not (item['question'].lower().startswith("calculate the"))
-                        and not (item['question'].lower().startswith("participants"))
-                        and not (len(item['question']) < 3)
-                        and not (isinstance(item['answers'][0],str) and item['answers'][0].lower() == "free response")
-                        and not (isinstance(item['answers'][0],str) and item['answers'][0].lower() == "requires missing")
-                        and not (isinstance(item['answers'][0],str) and item['answers'][0].lower() == "unknown")
-                        and not (isinstance(item['answers'][0],str) and item['answers'][0].lower() == "refer to")
-                        and not ("station" in item['question'].lower() and not item['question'].lower().startswith("station"))
-                        and not (bool(re.search(r"(q|Q)uestion [0-9]+[^:]",item['question'])))
-                        and not (bool(re.search(r"(?<=(((i|I)mages*)|(e|E)vents*)|((f|F)eatures*)|(row)|((p|P)owder)|(patient)|((l|L)abels*)|(labeled)|(horomone)|(items*)|(ganglion)|(disorders*)|((r|R)egion)|(when)|((N|n)euron)|(Box)|((s|S)pecimens*)|((m|M)odels*)|((l|L)ayers*)|(part of)|((s|S)olids*)|((f|F)igure)|((m|M)etals*)|((h|H)airs*)|((f|F)ibers*)|((p|P)lastics*)|((f|F)ingerprints*)|((s|S)oils*)|((s|S)tructures*)|((p|P)oint)|((u|U)nit)|((p|P)anel)|((f|F)eatures*)|((l|L)iquid)|((f|F)igures*)|((s|S)pecimens*)|((p|P)oints*)|((l|L)etters*)|((f|F)ibers*)|((s|S)ymbol)) (([A-Z]+|[0-9]+)[\s.,?!;:])",item['question'])))
-                        and not (len(item['answers']) == 1 and item['answers'][0] == '')
-                        and not (sum(map(lambda s: 1 if isinstance(s, str) and len(s)==1 else 0, item['answers'])) > 2)
-                        and not (False if not 'options' in item or item['options'] is None else (any(s == "A" for s in item['options']) and not "climate" in item['question'] and not "vitamin" in item['question']))
-                        and not (item['question'] == item['answers'][0])
-                        and not any(phrase in item['question'].lower() for phrase in [
-                            " a?", " b?", " c?", " d?", " g?", " h?", " i?", " j?", " k?", " l?", " m?", " n?", " o?", " p?", " q?", " r?", " s?", " t?", " u?"
-                            "this picture", "this image", "this diagram", "this map",
-                            "in figure", "pictured below",
-                            "this specimen", "this organism", "the photo below",
-                            "given information", "the table", "the structures labeled",
-                            "specimen 1", "specimen 2", "specimen 3", "specimen 4", "specimen 5",
-                            "specimen 6", "specimen 7", "specimen 8", "specimen 9", "specimen 10",
-                            "this individual", "Identify #", "diagram below", "the diagram", 
-                            "slide above", "picture below", "the picture", "shown above", "shown below", "question #",
-                            "indicated by", "diagram to the right", "this device", "these specimens", "multiple choice",
-                            "shown to the right", "(left)", "(right)", "graph above",
-                            "the reading on", "the image", 
-                            "labeled by", "which image", "above image", "below image", "in the image",
-                            "depicted", "the figure", "above?", "to the right", "the chart", 
-                            "the diagram", "red arrow", "black arrow", "the arrow",
-                            "labelled", "for the given", "if this", "above equation",
-                            "original test", "fossil above", "question (", "depicted", "projection 1", "projection 2", 
-                            "projection 3", "the map?", "circular symbol", "union hill", "locations 1", "location 1", 
-                            "at the right?", "on the map", "interpret the", "evidence a", "evidence b", 
-                            "evidence c", "which suspect", "what is the id ", "are you currently in a location where you cannot see or talk to your partner?", 
-                            "honor code", "from the provided answer key", "according to article", "previous question",
-                            "found at the scene", "according to elsa's bio", "from the scenario", "on my honor", 
-                            "following questions refer to light and electron microscopes", "given the following graph",
-                            "shown on the graph", "suspect no.", "from the given scenario", "the competitors"
-                        ])
-                        and not any(question in item['question'].lower() for question in [
-                            "information needed"
-                        ])
-                    ])
-            except json.JSONDecodeError:
-                print(f"Skipping invalid JSON line: {line.strip()}")
-    print("Unknown keys: ", bruh)
-    return [combined_data, excluded_data]
-
-# Combine the data from bank.txt
-raw = combine_bank_data()
-combined_bank = raw[0]
-
-for key, questions in combined_bank.items():
-    seen = set()
-    new_questions = []
-    for q in questions:
-        # 1. Set difficulty: default to 0.5 if missing/None, and cap values > 1 at 0.9.
-        if 'difficulty' not in q or q['difficulty'] is None:
-            q['difficulty'] = 0.5
-        elif q['difficulty'] > 1:
-            q['difficulty'] = 0.9
-        elif q['difficulty'] == 0:
-            q['difficulty'] = 0.1
-
-        # 2. Convert answer elements to integers if an options list exists and is non-empty.
-        if 'options' in q and isinstance(q['options'], list) and len(q['options']) > 0:
-            if 'answers' in q:
-                # If answers is a list
-                if isinstance(q['answers'], list):
-                    q['answers'] = [a if isinstance(a,int) or isinstance(a,list) or a is None else 1 if a.upper() == 'A' else 2 if a.upper() == 'B' else 3 if a.upper() == 'C' else 4 if a.upper() == 'D' else 5 if a.upper() == 'E' else 6 if a.upper(    ) == 'F' else a for a in q['answers']]
-                    # Check if every answer is numeric or a numeric string.
-                    all_numeric = all(
-                        isinstance(a, (int, float)) or (isinstance(a, str) and a.strip().isdigit())
-                        for a in q['answers']
-                    )
-                    if all_numeric:
-                        # Convert all answers to integers.
-                        q['answers'] = [int(a) for a in q['answers']]
-                    else:
-                        # If not all answers are numeric, take only the first answer,
-                        # and if it exactly matches one of the options, convert it to the
-                        # 1-indexed position of that option.
-                        first_ans = q['answers'][0]
-                        first_ans_str = str(first_ans)
-                        if first_ans_str in q['options']:
-                            q['answers'] = [q['options'].index(first_ans_str) + 1]
+        for key, accepted in accepted_questions(f, rejections):
+            if not key in combined_data:
+                combined_data[key] = []
+            combined_data[key].extend(accepted)
+    return [combined_data, rejections.report()]
+
+
+def normalize_question(q):
+    """
+    Fills in a question's difficulty and turns its answers into 1-indexed option numbers
+    where it has options. Changes q in place and returns it; normalize_questions() leaves
+    its input alone.
+    """
+    # 1. Set difficulty: default to 0.5 if missing/None, and cap values > 1 at 0.9.
+    if 'difficulty' not in q or q['difficulty'] is None:
+        q['difficulty'] = 0.5
+    elif q['difficulty'] > 1:
+        q['difficulty'] = 0.9
+    elif q['difficulty'] == 0:
+        q['difficulty'] = 0.1
+
+    # 2. Convert answer elements to integers if an options list exists and is non-empty.
+    if 'options' in q and isinstance(q['options'], list) and len(q['options']) > 0:
+        if 'answers' in q:
+            # If answers is a list
+            if isinstance(q['answers'], list):
+                q['answers'] = [a if isinstance(a,int) or isinstance(a,list) or a is None else 1 if a.upper() == 'A' else 2 if a.upper() == 'B' else 3 if a.upper() == 'C' else 4 if a.upper() == 'D' else 5 if a.upper() == 'E' else 6 if a.upper(    ) == 'F' else a for a in q['answers']]
+                # Check if every answer is numeric or a numeric string.
+                all_numeric = all(
+                    isinstance(a, (int, float)) or (isinstance(a, str) and a.strip().isdigit())
+                    for a in q['answers']
+                )
+                if all_numeric:
+                    # Convert all answers to integers.
+                    q['answers'] = [int(a) for a in q['answers']]
                 else:
-                    # When answers is a single value.
-                    if isinstance(q['answers'], (int, float)) or (isinstance(q['answers'], str) and q['answers'].strip().isdigit()):
-                        try:
-                            q['answers'] = int(q['answers'])
-                        except (ValueError, TypeError):
-                            pass
-                    else:
-                        # For a non-numeric answer, try matching it against the options.
-                        ans_str = str(q['answers'])
-                        if ans_str in q['options']:
-                            q['answers'] = q['options'].index(ans_str) + 1
-
-
-        # 3. Codebusters-specific filtering.
-        if key == "Codebusters":
-            question_text = q.get('question', '')
-            # Count the number of uppercase letters.
-            capital_count = sum(1 for c in question_text if c.isupper())
-            # Skip if the text is less than 200 characters and contains fewer than 25 capital letters.
-            if len(question_text) < 200 and capital_count < 25:
+                    # If not all answers are numeric, take only the first answer,
+                    # and if it exactly matches one of the options, convert it to the
+                    # 1-indexed position of that option.
+                    first_ans = q['answers'][0]
+                    first_ans_str = str(first_ans)
+                    if first_ans_str in q['options']:
+                        q['answers'] = [q['options'].index(first_ans_str) + 1]
+            else:
+                # When answers is a single value.
+                if isinstance(q['answers'], (int, float)) or (isinstance(q['answers'], str) and q['answers'].strip().isdigit()):
+                    try:
+                        q['answers'] = int(q['answers'])
+                    except (ValueError, TypeError):
+                        pass
+                else:
+                    # For a non-numeric answer, try matching it against the options.
+                    ans_str = str(q['answers'])
+                    if ans_str in q['options']:
+                        q['answers'] = q['options'].index(ans_str) + 1
+    return q
+
+
+def short_codebusters(key, q):
+    """Codebusters questions need a real ciphertext: at least 200 characters or 25 capitals."""
+    if key != "Codebusters":
+        return False
+    question_text = q.get('question', '')
+    # Count the number of uppercase letters.
+    capital_count = sum(1 for c in question_text if c.isupper())
+    return len(question_text) < 200 and capital_count < 25
+
+
+def answer_in_question(q):
+    """
+    Checks whether one of a question's text answers appears in the question itself. The
+    build has always run this on the last question of each event only, and keeps that
+    event's questions unfiltered by the Codebusters and duplicate checks when it holds.
+    """
+    for answer in q['answers']:
+        # Only text answers can appear in the question (a list or None used to crash the build)
+        if isinstance(answer, str) and answer.lower() in q.get("question").lower():
+            return True
+    return False
+
+
+def normalize_questions(questions):
+    """Yields a normalized copy of every question (see normalize_question())."""
+    for q in questions:
+        yield normalize_question(dict(q))
+
+
+def deduplicate(questions, event=None, rejections=None, clusters=None):
+    """
+    Drops repeated questions.
+
+    Args:
+        questions (iterable): Question dicts, normalized.
+        event (str): The questions' event, for rejections and clusters.
+        rejections (RejectionLog): Records every dropped question and the rule it failed.
+        clusters (QuestionClusters): Keep only the canonical copy of near-identical questions
+            (including ones already added to these clusters). If None, later questions with
+            the exact same text as an earlier one are dropped.
+
+    Returns:
+        list: The questions kept, in order.
+    """
+    if rejections is None:
+        rejections = RejectionLog(None)
+    if clusters is None:
+        seen = set()
+        kept = []
+        for q in questions:
+            question_text = q.get('question')
+            if question_text in seen:
+                rejections.add(event, 'duplicate', q)
                 continue
+            seen.add(question_text)
+            kept.append(q)
+        return kept
+    added = [(q, clusters.add(event, q)) for q in questions]
+    kept = []
+    for q, question_id in added:
+        if clusters.is_canonical(question_id):
+            kept.append(q)
+        else:
+            rejections.add(event, 'near_duplicate', q)
+    return kept
 
-        # 4. Filter out duplicate questions based on the "question" text.
-        question_text = q.get('question')
-        if question_text in seen:
+
+def build_bank(extractions, rejections=None, clusters=None, resolver=None):
+    """
+    Builds the final bank from extractions held in memory: maps event keys, filters,
+    normalizes and de-duplicates. The extractions are not modified.
+
+    Args:
+        extractions (iterable): Extractions as Gemini returns them, {event key: [questions]}.
+        rejections (RejectionLog): Records every dropped question and the first rule it failed.
+        clusters (QuestionClusters): De-duplicate near-identical questions through these
+            clusters, keeping each cluster's canonical copy. If None, only questions with the
+            exact same text in the same event are dropped.
+        resolver (EventResolver): Maps event keys to events (default: default_resolver()).
+
+    Returns:
+        dict: {event: [questions]}, events in order of first appearance.
+    """
+    if rejections is None:
+        rejections = RejectionLog(None)
+    combined_bank = {}
+    # Every accepted question in bank order, so clusters see them in the order build_streaming() does
+    in_order = []
+    for key, accepted in event_questions(extractions, rejections, resolver=resolver):
+        accepted = list(normalize_questions(accepted))
+        if not key in combined_bank:
+            combined_bank[key] = []
+        combined_bank[key].extend(accepted)
+        if clusters is not None:
+            in_order.extend((key, q) for q in accepted)
+
+    question_ids = {}
+    if clusters is not None:
+        for key, q in in_order:
+            if not short_codebusters(key, q):
+                question_ids[id(q)] = clusters.add(key, q)
+
+    for key, questions in combined_bank.items():
+        # An event whose last question holds its answer keeps every question, and none of
+        # them count as rejected
+        if questions and answer_in_question(questions[-1]):
             continue
-        seen.add(question_text)
-        new_questions.append(q)
-    flag = False
-    for answer in q['answers']:
-        if not isinstance(answer,int) and answer.lower() in q.get("question").lower():
-            flag = True 
-            break
-    if flag:
-        continue
-    combined_bank[key] = new_questions
+        new_questions = []
+        seen = set()
+        for q in questions:
+            # 3. Codebusters-specific filtering.
+            if short_codebusters(key, q):
+                rejections.add(key, 'codebusters_short', q)
+                continue
+            # 4. Filter out duplicate questions based on the "question" text.
+            if clusters is None:
+                question_text = q.get('question')
+                if question_text in seen:
+                    rejections.add(key, 'duplicate', q)
+                    continue
+                seen.add(question_text)
+            elif not clusters.is_canonical(question_ids[id(q)]):
+                rejections.add(key, 'near_duplicate', q)
+                continue
+            new_questions.append(q)
+        combined_bank[key] = new_questions
+    return combined_bank
+
+
+def build(filename="beta_bank.json", output="final.json", rejections=None, clusters=None, resolver=None):
+    """
+    Builds the final bank in memory (see build_bank()) and writes it with a single json.dump.
+
+    Args:
+        filename (str): The bank to read.
+        output (str): Where to write the final bank.
+        rejections (RejectionLog): Records every dropped question and the first rule it failed.
+        clusters (QuestionClusters): De-duplicate near-identical questions, as in build_bank().
+        resolver (EventResolver): Maps event keys to events (default: default_resolver()).
+    """
+    with open(filename, 'r') as f:
+        combined_bank = build_bank(parse_lines(f), rejections, clusters, resolver)
+
+    # Write the combined JSON object to bank_filtered.json
+    with open(output, 'w') as outfile:
+        json.dump(combined_bank, outfile)
+
+
+def _question_digest(q):
+    return hashlib.blake2b(str(q.get('question')).encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def prepare_questions(key, accepted, fingerprint):
+    """
+    Does the per-question work of build_streaming() that doesn't depend on other questions:
+    normalizes each question and fingerprints it for de-duplication.
+
+    Returns:
+        list: (question, fingerprint) pairs, the fingerprint None for short Codebusters questions.
+    """
+    prepared = []
+    for q in accepted:
+        normalize_question(q)
+        prepared.append((q, None if short_codebusters(key, q) else fingerprint(q)))
+    return prepared
+
+
+def line_ranges(filename, parts, start=0, end=None):
+    """
+    Splits the bytes from start to end of a file (both on line boundaries) into at most
+    `parts` ranges that start and end on line boundaries.
+
+    Returns:
+        list: (start, end) byte offsets, covering the whole span in order.
+    """
+    if end is None:
+        end = os.path.getsize(filename)
+    bounds = [start]
+    with open(filename, 'rb') as f:
+        for part in range(1, parts):
+            target = start + (end - start) * part // parts
+            if target <= bounds[-1]:
+                continue
+            # The line holding the byte before target ends where the next range starts
+            f.seek(target - 1)
+            f.readline()
+            if bounds[-1] < f.tell() < end:
+                bounds.append(f.tell())
+    bounds.append(end)
+    return [(range_start, range_end) for range_start, range_end in zip(bounds, bounds[1:]) if range_end > range_start]
+
+
+def range_lines(filename, start=0, end=None):
+    """Yields the lines of a file from byte offset start up to end."""
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        position = start
+        for line in f:
+            if end is not None and position >= end:
+                break
+            position += len(line)
+            yield line.decode('utf-8')
+
+
+def complete_length(filename):
+    """The length of a file up to its last newline, leaving out a line that is still being written."""
+    with open(filename, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline != -1:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+class _RecordedRejections:
+    """Stands in for a RejectionLog in a worker process, keeping rejections in order to replay later."""
+
+    def __init__(self, records):
+        self.records = records
+
+    def add(self, event, rule, item):
+        self.records.append(('reject', event, rule, item))
+
+    def add_all(self, event, rule, items):
+        for item in items:
+            self.add(event, rule, item)
+
+
+def _prepare_range(filename, start, end, fingerprint, resolver):
+    """
+    Filters, normalizes and fingerprints the bank lines in one byte range, in a worker process.
+
+    Returns:
+        tuple: (records in bank order, unknown keys, how often each event key was seen).
+        A record is ('reject', event, rule, item) or ('questions', event, prepared questions).
+    """
+    resolver = resolver.copy()
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    records = []
+    unknown_keys = set()
+    lines = io.StringIO(data.decode('utf-8'), newline=None)
+    for key, accepted in accepted_questions(lines, _RecordedRejections(records), unknown_keys, resolver):
+        records.append(('questions', key, prepare_questions(key, accepted, fingerprint)))
+    return records, unknown_keys, resolver.counts
+
+
+def prepared_ranges(filename, fingerprint, resolver, workers, start=0, end=None, range_bytes=RANGE_BYTES):
+    """
+    Runs _prepare_range() over a bank's line ranges in a process pool, yielding each
+    range's results in bank order. Only a few ranges per worker are in flight at once.
+    """
+    if end is None:
+        end = os.path.getsize(filename)
+    ranges = line_ranges(filename, max(workers * 4, (end - start) // range_bytes + 1), start, end)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for range_start, range_end in ranges:
+            pending.append(executor.submit(_prepare_range, filename, range_start, range_end, fingerprint, resolver))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# Spill file tags of questions that failed a check, and the rule each stands for
+_SPILL_REJECTIONS = {'c': 'codebusters_short', 'd': 'duplicate'}
+
+
+class StreamingBuild:
+    """
+    A final bank built up on disk as the bank is read.
+
+    Every event's questions are spilled to their own file as JSON lines, tagged with the
+    check they failed ('c' for Codebusters, 'd' for duplicate) or '+' if they passed (their
+    cluster id, when de-duplicating through clusters). Those rejections are only recorded
+    by write(), once it knows whether the event keeps every question.
+
+    The questions themselves stay on disk. What stays in memory grows with the number of
+    distinct questions rather than their size: exact duplicates are found through 16-byte
+    digests of the question text (the clusters' own digests and signatures, when
+    de-duplicating through clusters), and besides those only each event's last question
+    is kept. checkpoint() pickles those digests too. Reading more of the bank extends the
+    spill files, and write() turns them into final.json event by event, byte for byte what
+    build() writes.
+    """
+
+    def __init__(self, spill_dir, rejections=None, clusters=None, resolver=None):
+        self.spill_dir = spill_dir
+        self.rejections = rejections if rejections is not None else RejectionLog(None)
+        self.clusters = clusters
+        self.resolver = resolver if resolver is not None else default_resolver()
+        # Per event, in order of first appearance: spill file number, seen digests and last question
+        self.events = {}
+        self.seen = {}
+        self.last_question = {}
+        self._spills = {}
+        os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{self.events[key]:04d}.jsonl")
+
+    def add(self, key, prepared):
+        """Spills one line's prepared questions for an event (see prepare_questions())."""
+        if key not in self.events:
+            self.events[key] = len(self.events)
+            self.seen[key] = set()
+            self.last_question[key] = None
+        spill = self._spills.get(key)
+        if spill is None:
+            spill = self._spills[key] = open(self._spill_path(key), 'a')
+        for q, question_fingerprint in prepared:
+            if question_fingerprint is None:
+                tag = 'c'
+            elif self.clusters is not None:
+                tag = str(self.clusters.add(key, q, question_fingerprint))
+            elif question_fingerprint in self.seen[key]:
+                tag = 'd'
+            else:
+                self.seen[key].add(question_fingerprint)
+                tag = '+'
+            spill.write(tag + "\t" + json.dumps(q) + "\n")
+        if prepared:
+            self.last_question[key] = prepared[-1][0]
+
+    def read(self, filename, start=0, end=None, workers=1):
+        """
+        Filters, normalizes and spills the bank's lines from byte offset start up to end.
+
+        With more than one worker, the lines are split into line-aligned byte ranges that a
+        process pool filters, normalizes and fingerprints in parallel. Their results are
+        de-duplicated and spilled in bank order, so the output is the same as with one.
+        """
+        # Signatures are worth computing up front only where workers share the work
+        fingerprint = self.clusters.fingerprinter(with_signature=workers > 1) if self.clusters is not None else _question_digest
+        if workers > 1:
+            unknown_keys = set()
+            for records, range_unknown_keys, key_counts in prepared_ranges(filename, fingerprint, self.resolver, workers, start, end):
+                unknown_keys.update(range_unknown_keys)
+                self.resolver.add_counts(key_counts)
+                for record in records:
+                    if record[0] == 'reject':
+                        self.rejections.add(*record[1:])
+                    else:
+                        self.add(record[1], record[2])
+            print("Unknown keys: ", unknown_keys)
+        else:
+            self.read_extractions(parse_lines(range_lines(filename, start, end)))
+
+    def read_extractions(self, extractions):
+        """Filters, normalizes and spills extractions ({event key: [questions]}) in this process."""
+        fingerprint = self.clusters.fingerprinter(with_signature=False) if self.clusters is not None else _question_digest
+        for key, accepted in event_questions(extractions, self.rejections, resolver=self.resolver):
+            self.add(key, prepare_questions(key, accepted, fingerprint))
+
+    def close(self):
+        for spill in self._spills.values():
+            spill.close()
+        self._spills.clear()
+
+    def write(self, output):
+        """Writes the final bank from the spill files, replacing output only once it is complete."""
+        self.close()
+        partial = output + '.tmp'
+        with open(partial, 'w') as outfile:
+            outfile.write('{')
+            for number, key in enumerate(self.events):
+                keep_all = self.last_question[key] is not None and answer_in_question(self.last_question[key])
+                outfile.write((', ' if number else '') + json.dumps(key) + ': [')
+                first = True
+                with open(self._spill_path(key), 'r') as f:
+                    for line in f:
+                        tag, _, question = line.partition("\t")
+                        if not keep_all:
+                            if tag in _SPILL_REJECTIONS:
+                                self.rejections.add(key, _SPILL_REJECTIONS[tag], json.loads(question))
+                                continue
+                            if self.clusters is not None and not self.clusters.is_canonical(int(tag)):
+                                self.rejections.add(key, 'near_duplicate', json.loads(question))
+                                continue
+                        outfile.write(('' if first else ', ') + question[:-1])
+                        first = False
+                outfile.write(']')
+            outfile.write('}')
+        os.replace(partial, output)
+
+    def checkpoint(self):
+        """Returns everything restore() needs to carry on from this point."""
+        self.close()
+        return {
+            'events': self.events,
+            'seen': self.seen,
+            'last_question': self.last_question,
+            'clusters': self.clusters,
+            'resolver': self.resolver,
+            'spill_sizes': {key: os.path.getsize(self._spill_path(key)) for key in self.events},
+        }
+
+    @classmethod
+    def restore(cls, spill_dir, rejections, checkpoint):
+        """Picks a build up where checkpoint() left it, dropping anything spilled after that."""
+        build = cls(spill_dir, rejections, checkpoint['clusters'], checkpoint['resolver'])
+        build.events = checkpoint['events']
+        build.seen = checkpoint['seen']
+        build.last_question = checkpoint['last_question']
+        known = set()
+        for key, size in checkpoint['spill_sizes'].items():
+            path = build._spill_path(key)
+            known.add(os.path.basename(path))
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+        for name in os.listdir(spill_dir):
+            if name not in known:
+                os.remove(os.path.join(spill_dir, name))
+        return build
+
+
+def build_streaming(filename="beta_bank.json", output="final.json", rejections=None, clusters=None, spill_dir=None, workers=1, resolver=None, extractions=None):
+    """
+    Builds the final bank without holding its questions in memory, through a
+    StreamingBuild: memory grows only by a digest per distinct question (see StreamingBuild).
+
+    Args:
+        filename (str): The bank to read.
+        output (str): Where to write the final bank.
+        rejections (RejectionLog): Records every dropped question and the first rule it failed.
+        clusters (QuestionClusters): De-duplicate near-identical questions, as in build().
+        spill_dir (str): Directory for the spill files (default: a temporary directory, removed afterwards).
+        workers (int): Worker processes for filtering and normalizing.
+        resolver (EventResolver): Maps event keys to events (default: default_resolver()).
+        extractions (iterable): Read these extractions (e.g. store_extractions()) instead
+            of filename, in this process.
+    """
+    own_spill_dir = spill_dir is None
+    if own_spill_dir:
+        spill_dir = tempfile.mkdtemp(prefix='toDB-spill-', dir=os.path.dirname(os.path.abspath(output)))
+    streaming = StreamingBuild(spill_dir, rejections, clusters, resolver)
+    try:
+        if extractions is not None:
+            streaming.read_extractions(extractions)
+        else:
+            streaming.read(filename, workers=workers)
+        streaming.seen.clear()
+        streaming.write(output)
+    finally:
+        streaming.close()
+        if own_spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def rules_hash(clusters=None, resolver=None):
+    """
+    Hashes everything that decides what a build writes: this file (titles and normalization),
+    the filter rules, the event resolver and its events, the de-duplication code and its settings.
+    """
+    if resolver is None:
+        resolver = default_resolver()
+    digest = hashlib.sha256()
+    for module in (sys.modules[__name__], question_filter, question_dedup, minhash, event_resolver):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    digest.update(json.dumps(titles, sort_keys=True).encode('utf-8'))
+    digest.update(json.dumps(resolver.settings(), sort_keys=True).encode('utf-8'))
+    digest.update(json.dumps(clusters.settings() if clusters is not None else None, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def prefix_hash(filename, length):
+    """Hashes the first length bytes of a file."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def build_incremental(filename="beta_bank.json", output="final.json", rejections_path="rejected.jsonl", clusters=None, state_dir=STATE_DIR, workers=1, resolver=None):
+    """
+    Brings the final bank up to date with the lines appended to the bank since the last
+    incremental build.
+
+    The StreamingBuild's spill files and de-duplication state are kept in state_dir,
+    together with how far into the bank they go and a hash of that prefix. A run reads
+    only the lines after it, spills them, and rewrites the output from the spill files, so
+    the result is the same as a full build of the whole bank. The build starts over from
+    the beginning when the bank's prefix changed (it was rewritten rather than appended
+    to) or when rules_hash() does (the filter rules, titles or de-duplication settings).
+    A last line without its newline yet is left for the next run.
+
+    rejected.jsonl is kept in step: it is cut back to where the previous run's read ended,
+    which drops the records that run's write() made (a new line can change which copy a
+    cluster keeps, or whether an event keeps every question), and then extended.
+
+    Returns:
+        tuple: (RejectionLog, QuestionClusters or None, EventResolver), all covering the whole bank.
+    """
+    if resolver is None:
+        resolver = default_resolver()
+    rules = rules_hash(clusters, resolver)
+    source = os.path.abspath(filename)
+    state_path = os.path.join(state_dir, 'state.pickle')
+    spill_dir = os.path.join(state_dir, 'spill')
+    state = None
+    if os.path.exists(state_path):
+        with open(state_path, 'rb') as f:
+            state = pickle.load(f)
+        reason = None
+        if state['rules'] != rules:
+            reason = "the filter rules, titles or de-duplication settings changed"
+        elif state['input'] != source:
+            reason = f"the last build was of {state['input']}"
+        elif os.path.getsize(filename) < state['offset'] or prefix_hash(filename, state['offset']) != state['prefix_hash']:
+            reason = f"{filename} was rewritten, not just appended to"
+        elif not os.path.exists(rejections_path) or os.path.getsize(rejections_path) < state['rejections']['size']:
+            reason = f"{rejections_path} is missing or was cut short"
+        if reason is not None:
+            print(f"Rebuilding from scratch: {reason}")
+            state = None
+
+    if state is None:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        rejections = RejectionLog(rejections_path)
+        streaming = StreamingBuild(spill_dir, rejections, clusters, resolver)
+        start = 0
+    else:
+        rejections = RejectionLog.resume(rejections_path, state['rejections'])
+        streaming = StreamingBuild.restore(spill_dir, rejections, state['build'])
+        start = state['offset']
+    end = complete_length(filename)
+    print(f"Reading {end - start} new bytes of {filename}")
+    try:
+        streaming.read(filename, start, end, workers)
+        state = {
+            'rules': rules,
+            'input': source,
+            'offset': end,
+            'prefix_hash': prefix_hash(filename, end),
+            'rejections': rejections.checkpoint(),
+            'build': streaming.checkpoint(),
+        }
+        streaming.write(output)
+    finally:
+        streaming.close()
+    partial = state_path + '.tmp'
+    with open(partial, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(partial, state_path)
+    return rejections, streaming.clusters, streaming.resolver
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter, normalize and de-duplicate beta_bank.json into final.json.")
+    parser.add_argument('--input', default="beta_bank.json", help="bank to read (one JSON extraction per line)")
+    parser.add_argument('--output', default="final.json")
+    parser.add_argument('--stream', action='store_true', help="build with memory bounded by a digest per distinct question, spilling each event to disk")
+    parser.add_argument('--spill-dir', help="directory for --stream's spill files (default: a temporary directory)")
+    parser.add_argument('--exact-dedup', action='store_true', help="only drop questions whose text is exactly equal within an event")
+    parser.add_argument('--similarity', type=float, default=0.8, help="Jaccard similarity of word shingles and options at which questions count as near-duplicates")
+    parser.add_argument('--within-events', action='store_true', help="only cluster near-duplicates within the same event")
+    parser.add_argument('--workers', type=int, default=1, help="processes to filter and normalize with (0: one per core); more than one implies --stream")
+    parser.add_argument('--incremental', action='store_true', help="only read lines appended since the last --incremental build (rebuilds from scratch when the rules change)")
+    parser.add_argument('--state-dir', default=STATE_DIR, help="where --incremental keeps its state")
+    parser.add_argument('--from-store', nargs='?', const="extraction_store", metavar='DIR', help="read the latest extraction of every file from main.py's extraction store instead of --input")
+    parser.add_argument('--list-events', action='store_true', help="print the events titles maps to and exit")
+    args = parser.parse_args()
+    if args.list_events:
+        print("All values:", [*set([f for f in titles.values() if f is not None])])
+        return
+    if args.from_store and args.incremental:
+        parser.error("--incremental reads appended bank lines and can't be combined with --from-store")
+    workers = args.workers or os.cpu_count() or 1
 
+    clusters = None if args.exact_dedup else QuestionClusters(threshold=args.similarity, across_events=not args.within_events)
+    resolver = default_resolver()
+    if args.incremental:
+        rejections, clusters, resolver = build_incremental(args.input, args.output, "rejected.jsonl", clusters, args.state_dir, workers)
+    elif args.from_store:
+        # Records are read in this process, so --workers only decides whether to stream
+        rejections = RejectionLog("rejected.jsonl")
+        extractions = store_extractions(args.from_store)
+        if args.stream or workers > 1:
+            build_streaming(None, args.output, rejections, clusters, spill_dir=args.spill_dir, resolver=resolver, extractions=extractions)
+        else:
+            with open(args.output, 'w') as outfile:
+                json.dump(build_bank(extractions, rejections, clusters, resolver), outfile)
+    elif args.stream or workers > 1:
+        rejections = RejectionLog("rejected.jsonl")
+        build_streaming(args.input, args.output, rejections, clusters, spill_dir=args.spill_dir, workers=workers)
+    else:
+        rejections = RejectionLog("rejected.jsonl")
+        build(args.input, args.output, rejections, clusters)
+    rejections.close()
+    with open("excluded.json", 'w') as outfile:
+        json.dump(rejections.report(), outfile, indent=4)
+    resolver.write_table("event_resolution.json")
+    fallbacks = Counter(entry['method'] for entry in resolver.table().values())
+    print(f"Combined and filtered data written to {args.output}")
+    print(f"Resolved {len(resolver.counts)} distinct event keys (table in event_resolution.json): {dict(fallbacks.most_common())}")
+    print(f"Rejected {rejections.total()} questions (written to rejected.jsonl): {dict(rejections.by_rule.most_common())}")
+    if clusters is not None:
+        report = clusters.report()
+        with open("near_duplicates.json", 'w') as outfile:
+            json.dump(report, outfile, indent=4)
+        print(f"{report['duplicates']} near-duplicates in {report['clusters']} clusters ({report['cross_event_clusters']} spanning events), cluster sizes: {report['cluster_sizes']}")
 
 
-# Write the combined JSON object to bank_filtered.json
-with open("final.json", 'w') as outfile:
-    json.dump(combined_bank, outfile)
-with open("excluded.json", 'w') as outfile:
-    json.dump(raw[1],outfile, indent=4)
-print("Combined and filtered data written to final.json")
\ No newline at end of file
+if __name__ == "__main__":
+    main()